@@ -24,8 +24,38 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from keywordmatcher import KeywordMatcher
+from itertools import compress
+from numbers import Real
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _numeric_array(values, limit):
+    """
+    Converts a column of numbers into a NumPy array. Returns None if NumPy is
+    not installed or if the values (or the limit) are not plain numbers.
+    """
+    if numpy is None or not isinstance(limit, Real):
+        return None
+    array = numpy.array(values)
+    if array.dtype.kind not in "biuf":
+        return None
+    return array
+
+
+def _both(hits, other_hits):
+    if numpy is not None and isinstance(hits, numpy.ndarray) and isinstance(other_hits, numpy.ndarray):
+        return hits & other_hits
+    return [hit and other_hit for hit, other_hit in zip(hits, other_hits)]
+
 
 class AdCriterion(object):
+    cost = 0    # Criteria are evaluated in order of ascending cost
+
     def __init__(self, data):
         self._tagname = ""
 
@@ -38,12 +68,22 @@ class AdCriterion(object):
 
     def check(self, ad):
         raise NotImplementedError("AdCriterion has to be subclassed.")
+
+    def check_values(self, values):
+        """
+        Checks a column of tag values at once. Returns a list (or a NumPy
+        array) of booleans.
+        """
+        raise NotImplementedError("AdCriterion has to be subclassed.")
     
     @classmethod
     def from_json(cls, data):
-        for subclass in AdCriterion.__subclasses__():
-            if subclass.criterion_type == data["type"]:
+        for subclass in cls.__subclasses__():
+            if getattr(subclass, "criterion_type", None) == data["type"]:
                 return subclass(data)
+            criterion = subclass.from_json(data)
+            if criterion is not None:
+                return criterion
 
 
 class AdCriterionLessThan(AdCriterion):
@@ -52,6 +92,10 @@ class AdCriterionLessThan(AdCriterion):
     def __init__(self, data):
         self._tagname = data["tag"]
         self._limit = data["limit"]
+
+    @property
+    def limit(self):
+        return self._limit
     
     def check(self, ad):
         if self._limit >= ad[self._tagname]:
@@ -59,6 +103,12 @@ class AdCriterionLessThan(AdCriterion):
         else:
             return False
 
+    def check_values(self, values):
+        array = _numeric_array(values, self._limit)
+        if array is not None:
+            return self._limit >= array
+        return [self._limit >= value for value in values]
+
     def serialize(self):
         d = super(AdCriterionLessThan, self).serialize()
         d["type"] = self.criterion_type
@@ -72,6 +122,10 @@ class AdCriterionGreaterThan(AdCriterion):
     def __init__(self, data):
         self._tagname = data["tag"]
         self._limit = data["limit"]
+
+    @property
+    def limit(self):
+        return self._limit
     
     def check(self, ad):
         if self._limit <= ad[self._tagname]:
@@ -79,6 +133,12 @@ class AdCriterionGreaterThan(AdCriterion):
         else:
             return False
 
+    def check_values(self, values):
+        array = _numeric_array(values, self._limit)
+        if array is not None:
+            return self._limit <= array
+        return [self._limit <= value for value in values]
+
     def serialize(self):
         d = super(AdCriterionGreaterThan, self).serialize()
         d["type"] = self.criterion_type
@@ -86,75 +146,68 @@ class AdCriterionGreaterThan(AdCriterion):
         return d
 
 
-class AdCriterionKeywordsAll(AdCriterion):
-    criterion_type = "keywords_all"
+class AdCriterionKeywords(AdCriterion):
+    """
+    Base class for criteria that search keywords in a text tag. The keywords
+    are lowercased once and searched with a `KeywordMatcher`. Subclasses
+    implement match() which gets the tag's text already lowercased.
+    """
+    cost = 1
 
     def __init__(self, data):
         self._tagname = data["tag"]
         self._keywords = data["keywords"]
-    
+        self._matcher = KeywordMatcher([kwd.lower() for kwd in self._keywords])
+
+    @property
+    def keywords(self):
+        return self._keywords
+
     def check(self, ad):
-        for kwd in self._keywords:
-            if ad[self._tagname].lower().find(kwd.lower()) < 0:
-                return False
-        return True
+        return self.match(ad[self._tagname].lower())
+
+    def match(self, text):
+        raise NotImplementedError("AdCriterionKeywords has to be subclassed.")
 
     def serialize(self):
-        d = super(AdCriterionKeywordsAll, self).serialize()
+        d = super(AdCriterionKeywords, self).serialize()
         d["type"] = self.criterion_type
         d["keywords"] = self._keywords
         return d
 
 
-class AdCriterionKeywordsAny(AdCriterion):
-    criterion_type = "keywords_any"
-
-    def __init__(self, data):
-        self._tagname = data["tag"]
-        self._keywords = data["keywords"]
+class AdCriterionKeywordsAll(AdCriterionKeywords):
+    criterion_type = "keywords_all"
 
-    def check(self, ad):
-        for kwd in self._keywords:
-            if ad[self._tagname].lower().find(kwd.lower()) >= 0:
-                return True
-        return False
+    def match(self, text):
+        return self._matcher.contains_all(text)
 
-    def serialize(self):
-        d = super(AdCriterionKeywordsAny, self).serialize()
-        d["type"] = self.criterion_type
-        d["keywords"] = self._keywords
-        return d
 
+class AdCriterionKeywordsAny(AdCriterionKeywords):
+    criterion_type = "keywords_any"
 
-class AdCriterionKeywordsNot(AdCriterion):
-    criterion_type = "keywords_not"
+    def match(self, text):
+        return self._matcher.contains_any(text)
 
-    def __init__(self, data):
-        self._tagname = data["tag"]
-        self._keywords = data["keywords"]
 
-    def check(self, ad):
-        for kwd in self._keywords:
-            if ad[self._tagname].lower().find(kwd.lower()) >= 0:
-                return False
-        return True
+class AdCriterionKeywordsNot(AdCriterionKeywords):
+    criterion_type = "keywords_not"
 
-    def serialize(self):
-        d = super(AdCriterionKeywordsNot, self).serialize()
-        d["type"] = self.criterion_type
-        d["keywords"] = self._keywords
-        return d
+    def match(self, text):
+        return not self._matcher.contains_any(text)
 
 
 class AdAssessor:
     
     def __init__(self):
         self._criteria = []
+        self._predicate = None
     
     def add_criterion(self, criterion):
         if not isinstance(criterion, AdCriterion):
             raise TypeError("Expected type AdCriterion. Got {}".format(type(criterion)))
         self._criteria.append(criterion)
+        self._predicate = None
     
     def add_criteria(self, *args):
         for arg in args:
@@ -163,7 +216,78 @@ class AdAssessor:
     @property
     def criteria(self):
         return self._criteria
+
+    def _grouped_criteria(self):
+        """
+        Returns the criteria in order of cost as [(tagname, [criterion, ...]), ...]
+        with one group per tag and cost.
+        """
+        groups = []
+        for criterion in sorted(self._criteria, key = lambda criterion: criterion.cost):
+            group = next((group for group in groups
+                          if group[0] == criterion.tagname and group[1][0].cost == criterion.cost), None)
+            if group is None:
+                group = (criterion.tagname, [])
+                groups.append(group)
+            group[1].append(criterion)
+        return groups
+
+    def compile(self):
+        """
+        Compiles all criteria into a single predicate. Cheap criteria run
+        first and evaluation stops at the first criterion that fails. Keyword
+        criteria on the same tag share one lowercased copy of the tag's text.
+        """
+        plain_criteria = []
+        keyword_groups = []     # [(tagname, [match, ...]), ...]
+        for tagname, criteria in self._grouped_criteria():
+            if isinstance(criteria[0], AdCriterionKeywords):
+                keyword_groups.append((tagname, [criterion.match for criterion in criteria]))
+            else:
+                plain_criteria.extend(criterion.check for criterion in criteria)
+
+        def predicate(ad):
+            for check in plain_criteria:
+                if not check(ad):
+                    return False
+            for tagname, matches in keyword_groups:
+                text = ad[tagname].lower()
+                for match in matches:
+                    if not match(text):
+                        return False
+            return True
+
+        self._predicate = predicate
+        return predicate
     
     def check(self, ad):
-        return all([criterion.check(ad) for criterion in self._criteria])
-
+        predicate = self._predicate or self.compile()
+        return predicate(ad)
+
+    def check_batch(self, ads):
+        """
+        Checks many ads at once and returns a list of booleans (one per ad).
+        Each tag is extracted into a column once per group of criteria, and
+        only for ads that passed all previous groups. Numeric criteria compare
+        whole columns, with NumPy if it is installed.
+        """
+        alive = list(range(len(ads)))
+        for tagname, criteria in self._grouped_criteria():
+            if len(alive) == 0:
+                break
+            column = [ads[i][tagname] for i in alive]
+            if isinstance(criteria[0], AdCriterionKeywords):
+                column = [value.lower() for value in column]
+                for criterion in criteria:
+                    hits = [criterion.match(text) for text in column]
+                    alive = list(compress(alive, hits))
+                    column = list(compress(column, hits))
+            else:
+                hits = criteria[0].check_values(column)
+                for criterion in criteria[1:]:
+                    hits = _both(hits, criterion.check_values(column))
+                alive = list(compress(alive, hits))
+        mask = [False] * len(ads)
+        for i in alive:
+            mask[i] = True
+        return mask
@@ -24,9 +24,14 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import os
+import sys
 import pickle
 import datetime
-from threading import RLock
+import logging
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from threading import RLock, Thread
 
 
 class AdKeyError(Exception):
@@ -63,90 +68,417 @@ class Ad(dict):
         self[self._datetime_tag] = value
 
 
+class AdSchema(object):
+    """
+    The tag layout of compact ads. All ads with the same tag names (which
+    usually means all ads of one profile) share one schema instance. Tag names
+    are interned.
+    """
+
+    __slots__ = ("tags", "key_tag", "datetime_tag", "positions")
+
+    _shared = dict()
+    _shared_lock = RLock()
+
+    def __init__(self, tags, key_tag, datetime_tag):
+        self.tags = tuple(sys.intern(tag) for tag in tags)
+        self.key_tag = sys.intern(key_tag)
+        self.datetime_tag = sys.intern(datetime_tag)
+        self.positions = {tag: position for position, tag in enumerate(self.tags)}
+        if key_tag not in self.positions:
+            raise AttributeError("Key tag not present.")
+        if datetime_tag not in self.positions:
+            raise AttributeError("Datetime tag not present.")
+
+    @classmethod
+    def shared(cls, tags, key_tag, datetime_tag):
+        signature = (tuple(tags), key_tag, datetime_tag)
+        schema = cls._shared.get(signature)
+        if schema is None:
+            with cls._shared_lock:
+                schema = cls._shared.setdefault(signature, cls(*signature))
+        return schema
+
+    def __reduce__(self):
+        # Unpickled ads share the schema instance as well.
+        return (AdSchema.shared, (self.tags, self.key_tag, self.datetime_tag))
+
+
+class CompactAd(Mapping):
+    """
+    A memory efficient alternative to `Ad`. The tag values are stored in a
+    tuple and the tag names in a shared `AdSchema`. The mapping interface is
+    read-only except for existing tags.
+    """
+
+    __slots__ = ("_schema", "_values")
+
+    def __init__(self, tags, key_tag, datetime_tag):
+        self._schema = AdSchema.shared(tags.keys(), key_tag, datetime_tag)
+        self._values = tuple(tags.values())
+
+    @property
+    def schema(self):
+        return self._schema
+
+    def __getitem__(self, tag):
+        return self._values[self._schema.positions[tag]]
+
+    def __setitem__(self, tag, value):
+        position = self._schema.positions[tag]
+        self._values = self._values[:position] + (value,) + self._values[position + 1:]
+
+    def __iter__(self):
+        return iter(self._schema.tags)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return "CompactAd({})".format(dict(self))
+
+    def __getstate__(self):
+        return (self._schema, self._values)
+
+    def __setstate__(self, state):
+        self._schema, self._values = state
+
+    @property
+    def key(self):
+        return self[self._schema.key_tag]
+
+    @key.setter
+    def key(self, value):
+        self[self._schema.key_tag] = value
+
+    @property
+    def datetime(self):
+        return self[self._schema.datetime_tag]
+
+    @datetime.setter
+    def datetime(self, value):
+        self[self._schema.datetime_tag] = value
+
+
 class AdStore(object):
     
-    def __init__(self, path = None, autosave = True, autosort = True):
+    def __init__(self, path = None, autosave = True, autosort = True, journal = False, compact_every = 1000,
+                 max_age = None, max_count = None):
         """
-        'flag' has the same meaning as the 'flag' parameter in anydbm.open()
+        If `journal` is `True` the store is persisted as a snapshot (at `path`)
+        plus an append-only journal (at `path` + ".journal"). Every call to
+        add_ads() or remove_ads() appends one record to the journal. After
+        `compact_every` records the journal is folded into a new snapshot by a
+        background thread.
+
+        `max_age` (a timedelta or seconds) and `max_count` limit how many ads
+        are retained. The oldest ads are evicted whenever ads are added.
         """
         self._path = path
         self._autosave = autosave
         self._autosort = autosort
+        self._journal = journal and path is not None
+        self._compact_every = compact_every
+        if max_age is not None and not isinstance(max_age, datetime.timedelta):
+            max_age = datetime.timedelta(seconds = max_age)
+        self._max_age = max_age
+        self._max_count = max_count
+        self._journal_file = None
+        self._journal_records = 0
+        self._compaction = None
         self._lock = RLock()
         self.load()
     
     def _sort_by_date(self):
+        """
+        Fully sorts the store. This is only needed after loading. Afterwards
+        add_ads() and remove_ads() keep the order using `self._dates`, a
+        list of the ads' datetimes parallel to `self._ads`.
+        """
         try:
             self._ads = sorted(self._ads, key = lambda ad: ad.datetime)
+            self._dates = [ad.datetime for ad in self._ads]
         except AdKeyError:
             pass
+
+    def _insert_sorted(self, ads):
+        """
+        Inserts `ads` into the sorted store. New ads usually are newer than
+        all stored ads and are simply appended. Others are placed by
+        bisection behind stored ads with the same datetime.
+        """
+        ads = sorted(ads, key = lambda ad: ad.datetime)
+        if len(ads) == 0: return
+        if len(self._dates) == 0 or self._dates[-1] <= ads[0].datetime:
+            self._ads.extend(ads)
+            self._dates.extend(ad.datetime for ad in ads)
+            return
+        for ad in ads:
+            idx = bisect_right(self._dates, ad.datetime)
+            self._ads.insert(idx, ad)
+            self._dates.insert(idx, ad.datetime)
+
+    def _remove_sorted(self, ad):
+        idx = bisect_left(self._dates, ad.datetime)
+        while self._ads[idx].key != ad.key:
+            idx += 1
+        del self._ads[idx]
+        del self._dates[idx]
+
+    def _rebuild_index(self):
+        """
+        The index maps each ad key to the stored ad. It is kept in sync with
+        `self._ads` so lookups by key never have to scan the list.
+        """
+        self._index = {ad.key: ad for ad in self._ads}
     
     def length(self):
         return len(self._ads)
+
+    def contains(self, key):
+        return key in self._index
+
+    def get(self, key, default = None):
+        return self._index.get(key, default)
     
     def save(self):
-        self._lock.acquire()
         if not self._path: return
-        try:
-            with open(self._path, "wb") as f:
-                pickler = pickle.Pickler(f)
-                pickler.dump(self._ads)
-        except: raise
-        self._lock.release()
+        with self._lock:
+            if self._journal:
+                self._wait_for_compaction()
+                self._rotate_journal()
+                self._compact(list(self._ads))
+            else:
+                self._write_snapshot(self._ads)
         return True
     
     def load(self):
-        self._lock.acquire()
-        if not self._path:
+        with self._lock:
+            self._wait_for_compaction()
+            self._close_journal()
             self._ads = []
-            self._lock.release()
-            return
+            if self._path:
+                try:
+                    with open(self._path, "rb") as f:
+                        unpickler = pickle.Unpickler(f)
+                        self._ads = unpickler.load()
+                except EOFError: pass
+                except IOError: pass
+            self._rebuild_index()
+            self._dates = []
+            if self._autosort: self._sort_by_date()
+            if self._journal:
+                self._load_journal()
+            evicted_keys = self._evict()
+            if self._autosave and evicted_keys: self._persist(("-", evicted_keys))
+
+    def close(self):
+        """
+        Waits for a running compaction and closes the journal.
+        """
+        with self._lock:
+            self._wait_for_compaction()
+            self._close_journal()
+
+    def _write_snapshot(self, ads):
+        """
+        The snapshot is written to a temporary file first and then moved over
+        the old one, so a crash never leaves a half written snapshot behind.
+        """
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickler = pickle.Pickler(f)
+            pickler.dump(ads)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
+
+    def _load_journal(self):
+        replayed = self._replay_journal(self.journal_path + ".old")
+        replayed += self._replay_journal(self.journal_path)
+        if replayed and self._autosort:
+            self._sort_by_date()
+        self._journal_file = open(self.journal_path, "ab")
+        self._journal_records = replayed
+        if os.path.exists(self.journal_path + ".old"):
+            # A previous compaction did not finish. The new snapshot contains
+            # the old journal and replaying the current one again is harmless.
+            self._compact(list(self._ads))
+
+    def _replay_journal(self, path):
+        """
+        Applies all records in the journal at `path` and returns how many
+        records were replayed. A torn record at the end of the journal (e.g.
+        after a crash) is cut off.
+        """
+        replayed = 0
         try:
-            with open(self._path, "rb") as f:
+            with open(path, "r+b") as f:
                 unpickler = pickle.Unpickler(f)
-                self._ads = unpickler.load()
-        except EOFError: pass
+                good_offset = 0
+                while True:
+                    try:
+                        operation, payload = unpickler.load()
+                    except EOFError:
+                        break
+                    except (pickle.UnpicklingError, ValueError, TypeError, AttributeError):
+                        f.truncate(good_offset)
+                        break
+                    good_offset = f.tell()
+                    if operation == "+":
+                        for ad in payload:
+                            if ad.key not in self._index:
+                                self._index[ad.key] = ad
+                                self._ads.append(ad)
+                    elif operation == "-":
+                        keys = set(key for key in payload if self._index.pop(key, None) is not None)
+                        self._ads = [ad for ad in self._ads if ad.key not in keys]
+                    replayed += 1
         except IOError: pass
+        return replayed
+
+    def _append_journal(self, operation, payload):
+        if len(payload) == 0: return
+        pickle.dump((operation, payload), self._journal_file)
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+        self._journal_records += 1
+        if self._journal_records >= self._compact_every and self._compaction is None:
+            self._rotate_journal()
+            snapshot = list(self._ads)
+            self._compaction = Thread(target=self._compact, args=(snapshot,), daemon=True)
+            self._compaction.start()
+
+    def _rotate_journal(self):
+        """
+        Moves the current journal aside (".journal.old") and starts a fresh
+        one. The old journal is deleted once the snapshot containing all its
+        records has been written.
+        """
+        self._close_journal()
+        os.replace(self.journal_path, self.journal_path + ".old")
+        self._journal_file = open(self.journal_path, "ab")
+        self._journal_records = 0
+
+    def _compact(self, snapshot):
+        try:
+            self._write_snapshot(snapshot)
+            os.remove(self.journal_path + ".old")
+        except IOError as error:
+            logging.error("Compaction of {} failed: {}".format(self._path, error))
         finally:
-            if not hasattr(self, "_ads"): self._ads = []
-            self._lock.release()
+            self._compaction = None
+
+    def _wait_for_compaction(self):
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def _close_journal(self):
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
 
     def add_ads(self, ads):
         """
         'ads' is a list of new ads
         """
-        self._lock.acquire()
-        added_ads = []
-        cur_keys = [ad.key for ad in self._ads]
-        new_keys = [ad.key for ad in ads]
-        for i in range(len(new_keys)):
-            if new_keys[i] not in cur_keys:
-                self._ads.append(ads[i])
-                added_ads.append(ads[i])
-        if self._autosort: self._sort_by_date()
-        if self._autosave: self.save()
-        self._lock.release()
-        return added_ads
+        with self._lock:
+            added_ads = []
+            for ad in ads:
+                if ad.key not in self._index:
+                    self._index[ad.key] = ad
+                    added_ads.append(ad)
+            if self._autosort:
+                self._insert_sorted(added_ads)
+            else:
+                self._ads.extend(added_ads)
+            evicted_keys = self._evict()
+            if self._autosave: self._persist(("+", added_ads), ("-", evicted_keys))
+            return added_ads
+
+    def _evict(self):
+        """
+        Applies the retention policy and returns the keys of the evicted ads.
+        In a sorted store the evicted ads are always a prefix of the list.
+        """
+        if self._max_age is None and self._max_count is None:
+            return []
+        cutoff = None
+        if self._max_age is not None:
+            cutoff = datetime.datetime.now() - self._max_age
+        if not self._autosort:
+            retained = [ad for ad in self._ads if cutoff is None or ad.datetime >= cutoff]
+            if self._max_count is not None and len(retained) > self._max_count:
+                retained = sorted(retained, key = lambda ad: ad.datetime)[len(retained) - self._max_count:]
+            retained_keys = set(ad.key for ad in retained)
+            evicted = [ad for ad in self._ads if ad.key not in retained_keys]
+            self._ads = [ad for ad in self._ads if ad.key in retained_keys]
+        else:
+            count = 0 if cutoff is None else bisect_left(self._dates, cutoff)
+            if self._max_count is not None:
+                count = max(count, len(self._ads) - self._max_count)
+            evicted = self._ads[:count]
+            del self._ads[:count]
+            del self._dates[:count]
+        for ad in evicted:
+            del self._index[ad.key]
+        return [ad.key for ad in evicted]
     
     def remove_ads(self, ads):
-        self._lock.acquire()
-        removed_ads = []
-        cur_keys = [ad.key for ad in self._ads]
-        new_keys = [ad.key for ad in ads]
-        for i in range(len(new_keys)):
-            if new_keys[i] in cur_keys:
-                idx = cur_keys.index(new_keys[i])
-                del self._ads[idx]
-                del cur_keys[idx]
-                removed_ads.append(ads[i])
-        if self._autosort: self._sort_by_date()
-        if self._autosave: self.save()
-        self._lock.release()
-        return removed_ads
+        with self._lock:
+            removed_ads = []
+            removed_keys = set()
+            for ad in ads:
+                stored_ad = self._index.pop(ad.key, None)
+                if stored_ad is not None:
+                    removed_keys.add(ad.key)
+                    removed_ads.append(ad)
+                    if self._autosort: self._remove_sorted(stored_ad)
+            if removed_keys and not self._autosort:
+                self._ads = [ad for ad in self._ads if ad.key not in removed_keys]
+            if self._autosave: self._persist(("-", list(removed_keys)))
+            return removed_ads
+
+    def _persist(self, *records):
+        if self._journal:
+            for operation, payload in records:
+                self._append_journal(operation, payload)
+        else:
+            self.save()
+
+    def ads_between(self, start = None, end = None):
+        """
+        Returns all ads with `start` <= datetime <= `end` ordered by datetime.
+        Either bound can be None.
+        """
+        with self._lock:
+            if not self._autosort:
+                return sorted((ad for ad in self._ads
+                               if (start is None or start <= ad.datetime) and (end is None or ad.datetime <= end)),
+                              key = lambda ad: ad.datetime)
+            first = 0 if start is None else bisect_left(self._dates, start)
+            last = len(self._dates) if end is None else bisect_right(self._dates, end)
+            return self._ads[first:last]
 
     @property
     def path(self):
         return self._path
+
+    def serialize(self):
+        """
+        The store options as accepted by the create_observer command.
+        """
+        backend = None
+        if self._path is not None:
+            backend = "journal" if self._journal else "pickle"
+        max_age = self._max_age.total_seconds() if self._max_age is not None else None
+        return {"backend": backend, "max_age": max_age, "max_count": self._max_count}
+
+    @property
+    def journal_path(self):
+        if not self._journal: return None
+        return self._path + ".journal"
     
     def __getitem__(self, key):
-        return self._ads[key]
\ No newline at end of file
+        return self._ads[key]
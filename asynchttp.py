@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+An HTTP/1.1 client for asyncio built on the stdlib streams. It speaks just
+enough HTTP for the connector: GET requests over kept-alive connections,
+Content-Length and chunked bodies and redirects.
+"""
+
+import io
+import ssl
+import time
+import asyncio
+import http.client
+import urllib.parse
+from collections import deque
+
+from httppool import Response
+
+
+class AsyncConnectionPool(object):
+    """
+    The asyncio counterpart of `httppool.ConnectionPool`. Connections belong
+    to the event loop they were opened in. When the pool is used from another
+    loop the idle connections of the previous one are dropped.
+    """
+
+    _stale_errors = (ConnectionResetError, BrokenPipeError, ConnectionAbortedError,
+                     http.client.RemoteDisconnected, asyncio.IncompleteReadError)
+    _redirects = (301, 302, 303, 307, 308)
+
+    def __init__(self, max_size = 4, idle_timeout = 30.0, timeout = 30.0):
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._idle = dict()     # (scheme, host, port) -> deque([(reader, writer, last used), ...])
+        self._ssl_context = None
+        self._loop = None       # the loop the idle connections belong to
+
+    def configure(self, max_size = None, idle_timeout = None):
+        if max_size is not None: self._max_size = max_size
+        if idle_timeout is not None: self._idle_timeout = idle_timeout
+
+    async def _acquire(self, origin):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._idle.clear()
+            self._loop = loop
+        now = time.monotonic()
+        idle = self._idle.get(origin)
+        while idle:
+            reader, writer, last_used = idle.pop()
+            if now - last_used <= self._idle_timeout and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = origin
+        context = None
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            context = self._ssl_context
+        reader, writer = await asyncio.open_connection(host, port, ssl = context)
+        return reader, writer, False
+
+    def _release(self, origin, reader, writer):
+        idle = self._idle.setdefault(origin, deque())
+        if len(idle) < self._max_size:
+            idle.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+
+    def close(self):
+        """
+        Closes all idle connections. Those of a loop that is closed already
+        are just dropped.
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            for idle in self._idle.values():
+                for reader, writer, _ in idle:
+                    writer.close()
+        self._idle.clear()
+
+    async def _read_body(self, reader, status, headers):
+        """
+        Returns the body and whether the connection can be kept alive.
+        """
+        if status in (204, 304) or 100 <= status < 200:
+            return b"", True
+        if "chunked" in (headers.get("Transfer-Encoding") or "").lower():
+            chunks = []
+            while True:
+                size_line = await reader.readline()
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass    # trailers
+                    return b"".join(chunks), True
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+        length = headers.get("Content-Length")
+        if length is not None:
+            return await reader.readexactly(int(length)), True
+        return await reader.read(), False
+
+    async def _exchange(self, reader, writer, origin, path, headers):
+        scheme, host, port = origin
+        default_port = 443 if scheme == "https" else 80
+        lines = ["GET {} HTTP/1.1".format(path),
+                 "Host: {}".format(host if port == default_port else "{}:{}".format(host, port))]
+        lines.extend("{}: {}".format(name, value) for name, value in headers.items())
+        writer.write("\r\n".join(lines).encode("latin-1") + b"\r\n\r\n")
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected("Remote end closed connection without response")
+        try:
+            version, status = status_line.decode("latin-1").split(None, 2)[:2]
+            status = int(status)
+        except ValueError:
+            raise http.client.BadStatusLine(status_line)
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            header_lines.append(line)
+            if line in (b"\r\n", b"\n", b""):
+                break
+        response_headers = http.client.parse_headers(io.BytesIO(b"".join(header_lines)))
+        body, keep_alive = await self._read_body(reader, status, response_headers)
+        keep_alive = (keep_alive and version == "HTTP/1.1"
+                      and (response_headers.get("Connection") or "").lower() != "close")
+        return status, response_headers, body, keep_alive
+
+    async def _send(self, origin, path, headers):
+        while True:
+            reader, writer, reused = await self._acquire(origin)
+            try:
+                status, response_headers, body, keep_alive = await self._exchange(reader, writer, origin,
+                                                                                  path, headers)
+            except self._stale_errors:
+                writer.close()
+                if reused:
+                    continue    # The server closed the idle connection. Try a fresh one.
+                raise
+            except BaseException:   # includes the cancellation by a timeout
+                writer.close()
+                raise
+            if keep_alive:
+                self._release(origin, reader, writer)
+            else:
+                writer.close()
+            return status, response_headers, body
+
+    async def request(self, url, headers = None, max_redirects = 5):
+        """
+        Sends a GET request and returns a `httppool.Response`. Redirects are
+        followed. Raises `http.client.HTTPException` or `OSError` if the
+        request fails.
+        """
+        for _ in range(max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                raise ValueError("Unsupported URL: {}".format(url))
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+            try:
+                status, response_headers, body = await asyncio.wait_for(
+                    self._send((parts.scheme, parts.hostname, port), path, headers or dict()), self._timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError("Connection to {} timed out".format(parts.hostname))
+            except asyncio.IncompleteReadError as error:
+                raise http.client.IncompleteRead(error.partial, error.expected)
+            location = response_headers.get("Location")
+            if status not in self._redirects or location is None:
+                return Response(url, status, response_headers, body)
+            url = urllib.parse.urljoin(url, location)
+        raise http.client.HTTPException("Too many redirects")
+
+
+shared_pool = AsyncConnectionPool()
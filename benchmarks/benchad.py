@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Compares the memory used by `Ad` and `CompactAd` for ads with the tags of the
+Willhaben profile. Run from the repository root:
+
+    python3 -m benchmarks.benchad [count]
+"""
+
+import sys
+import datetime
+import tracemalloc
+
+from adstore import Ad, CompactAd
+
+
+def make_tags(nr):
+    return {"id": nr,
+            "url": "http://www.willhaben.at/iad/kaufen-und-verkaufen/d/ad-{}/".format(nr),
+            "title": "Ad number {}".format(nr),
+            "price": float(nr % 500),
+            "description": "Some description of ad number {} ".format(nr) * 4,
+            "image": "http://cache.willhaben.at/mmo/{}.jpg".format(nr),
+            "zip": 1010 + nr % 100,
+            "city": "Wien",
+            "datetime": datetime.datetime(2014, 1, 1) + datetime.timedelta(minutes = nr),
+            "milage": 0,
+            "year": 0,
+            "horsepower": 0,
+            "fuel": 0}
+
+
+def measure(cls, all_tags):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ads = [cls(tags, "id", "datetime") for tags in all_tags]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(ads)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # The tag values are created up front. Both classes reference the same
+    # value objects, so only the per-ad overhead is measured.
+    all_tags = [make_tags(nr) for nr in range(count)]
+    ad_bytes = measure(Ad, all_tags)
+    compact_bytes = measure(CompactAd, all_tags)
+    print("{} ads with {} tags".format(count, len(all_tags[0])))
+    print("Ad:        {:8.1f} bytes per ad".format(ad_bytes))
+    print("CompactAd: {:8.1f} bytes per ad ({:.0%} of Ad)".format(compact_bytes, compact_bytes / ad_bytes))
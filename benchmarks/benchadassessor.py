@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Measures how many ads per second an AdAssessor checks. The legacy numbers
+replay how criteria were evaluated before they were compiled: every criterion
+runs and every keyword criterion lowercases the tag and all keywords. Run from
+the repository root:
+
+    python3 -m benchmarks.benchadassessor [count] [excluded keywords]
+"""
+
+import sys
+import random
+import timeit
+
+from adstore import Ad
+from adassessor import AdAssessor, AdCriterion
+
+WORDS = ["kinderwagen", "buggy", "reboarder", "isofix", "maxi", "cosi", "neu", "gebraucht", "defekt",
+         "abholung", "wien", "graz", "linz", "versand", "top", "zustand", "rot", "blau", "schwarz"]
+
+
+def make_ads(count):
+    random.seed(1)
+    return [Ad({"id": nr, "datetime": nr,
+                "title": " ".join(random.choice(WORDS) for _ in range(5)).title(),
+                "description": " ".join(random.choice(WORDS) for _ in range(40)),
+                "price": float(random.randint(0, 1000))},
+               "id", "datetime")
+            for nr in range(count)]
+
+
+def make_criteria(excluded):
+    return [{"tag": "description", "type": "keywords_not",
+             "keywords": ["Ausschluss{}".format(nr) for nr in range(excluded)] + ["defekt"]},
+            {"tag": "title", "type": "keywords_any", "keywords": ["Reboarder", "Isofix", "Maxi"]},
+            {"tag": "price", "type": "less_than", "limit": 350}]
+
+
+def legacy_check(criteria, ad):
+    def check(data):
+        value = ad[data["tag"]]
+        if data["type"] == "less_than":
+            return data["limit"] >= value
+        found = [value.lower().find(kwd.lower()) >= 0 for kwd in data["keywords"]]
+        return any(found) if data["type"] == "keywords_any" else not any(found)
+    return all([check(data) for data in criteria])
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    excluded = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    ads = make_ads(count)
+    criteria = make_criteria(excluded)
+    assessor = AdAssessor()
+    assessor.add_criteria(*[AdCriterion.from_json(data) for data in criteria])
+
+    legacy_hits = [legacy_check(criteria, ad) for ad in ads]
+    assert legacy_hits == [assessor.check(ad) for ad in ads]
+    assert legacy_hits == assessor.check_batch(ads)
+
+    legacy = min(timeit.repeat(lambda: [legacy_check(criteria, ad) for ad in ads], number = 1, repeat = 3))
+    compiled = min(timeit.repeat(lambda: [assessor.check(ad) for ad in ads], number = 1, repeat = 3))
+    batch = min(timeit.repeat(lambda: assessor.check_batch(ads), number = 1, repeat = 3))
+    print("{} ads, {} excluded keywords, {} hits".format(count, excluded + 1, sum(legacy_hits)))
+    print("legacy:   {:10.0f} ads/s".format(count / legacy))
+    print("compiled: {:10.0f} ads/s".format(count / compiled))
+    print("batch:    {:10.0f} ads/s".format(count / batch))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Measures how the cost of one poll (adding a batch of new ads) scales with the
+number of ads that are already stored. Run from the repository root:
+
+    python3 -m benchmarks.benchadstore [sizes...]
+"""
+
+import sys
+import timeit
+
+from adstore import Ad, AdStore
+
+
+def make_ads(start, count):
+    return [Ad({"id": nr, "dt": nr}, "id", "dt") for nr in range(start, start + count)]
+
+
+def legacy_add_ads(stored, ads):
+    """
+    The former AdStore.add_ads dedup loop that scanned a fresh key list.
+    """
+    added_ads = []
+    cur_keys = [ad.key for ad in stored]
+    new_keys = [ad.key for ad in ads]
+    for i in range(len(new_keys)):
+        if new_keys[i] not in cur_keys:
+            added_ads.append(ads[i])
+    return added_ads
+
+
+def bench(size, batch = 50, repeat = 5):
+    stored = make_ads(0, size)
+    # half of the batch is already known, the other half is new
+    batch_ads = make_ads(size - batch // 2, batch)
+    known_ads = stored[-batch:]
+
+    store = AdStore(autosave = False, autosort = False)
+    store.add_ads(stored)
+
+
+    legacy_number = 1 if size >= 100000 else 10
+    legacy = min(timeit.repeat(lambda: legacy_add_ads(stored, batch_ads),
+                               number = legacy_number, repeat = repeat)) / legacy_number
+    lookup = min(timeit.repeat(lambda: [store.contains(ad.key) for ad in batch_ads],
+                               number = 100, repeat = repeat)) / 100
+    dedup = min(timeit.repeat(lambda: store.add_ads(known_ads),
+                               number = 100, repeat = repeat)) / 100
+    return legacy, lookup, dedup
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 1000000]
+    print("{:>10} {:>14} {:>14} {:>14}".format("stored", "legacy [ms]", "contains [ms]", "add_ads [ms]"))
+    for size in sizes:
+        legacy, lookup, dedup = bench(size)
+        print("{:>10} {:>14.3f} {:>14.3f} {:>14.3f}".format(size, legacy * 1e3, lookup * 1e3, dedup * 1e3))
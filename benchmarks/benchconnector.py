@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Measures the cost of computing page URLs when the Connector walks `maxpages`
+pages of the Willhaben profile. Fetching and parsing are stubbed out. The
+legacy numbers replay how every page URL used to be derived from the first
+page. Run from the repository root:
+
+    python3 -m benchmarks.benchconnector [maxpages]
+"""
+
+import sys
+import datetime
+import timeit
+
+from connector import Connector
+from httppool import Response
+from profiles.willhaben import WillhabenProfile
+
+URL = "http://www.willhaben.at/iad/kaufen-und-verkaufen/marktplatz?CATEGORY/MAINCATEGORY=68&CATEGORY/SUBCATEGORY=3914"
+
+
+class CountingProfile(WillhabenProfile):
+    """
+    Counts next_page() calls. Every page holds one ad newer than any time limit.
+    """
+
+    def __init__(self):
+        super(CountingProfile, self).__init__()
+        self.next_page_calls = 0
+
+    def next_page(self, url):
+        self.next_page_calls += 1
+        return super(CountingProfile, self).next_page(url)
+
+    def parse(self, html):
+        return [{"id": 1, "datetime": datetime.datetime.max}]
+
+
+class StubConnector(Connector):
+
+    def _request(self, url, conditional = False):
+        return Response(url, 200, dict(), b"")
+
+
+def legacy_page_urls(profile, maxpages):
+    urls = []
+    for page in range(maxpages):
+        url = profile.first_page(URL)
+        for i in range(page):
+            url = profile.next_page(url)
+        urls.append(url)
+    return urls
+
+
+if __name__ == "__main__":
+    maxpages = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    timelimit = datetime.datetime(1970, 1, 1)
+
+    profile = CountingProfile()
+    legacy = min(timeit.repeat(lambda: legacy_page_urls(profile, maxpages), number = 1, repeat = 3))
+    legacy_calls = profile.next_page_calls // 3
+
+    profile = CountingProfile()
+    connector = StubConnector(URL, profile)
+    streamed = min(timeit.repeat(lambda: connector.ads_after(timelimit, maxpages), number = 1, repeat = 3))
+    streamed_calls = profile.next_page_calls // 3
+
+    print("maxpages = {}".format(maxpages))
+    print("legacy:   {:8.2f} ms, {:6} next_page() calls".format(legacy * 1e3, legacy_calls))
+    print("streamed: {:8.2f} ms, {:6} next_page() calls".format(streamed * 1e3, streamed_calls))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Compares KeywordMatcher's automaton with a str search per keyword for a
+growing number of keywords and reports from which count on the automaton is
+faster. KeywordMatcher.automaton_threshold is based on this crossover. Run
+from the repository root:
+
+    python3 -m benchmarks.benchkeywordmatcher [text length]
+"""
+
+import sys
+import random
+import timeit
+
+from keywordmatcher import KeywordMatcher
+from benchmarks.benchadassessor import WORDS
+
+COUNTS = [16, 32, 64, 96, 128, 160, 192, 256, 384, 512]
+
+
+def make_texts(length, count = 200):
+    random.seed(1)
+    texts = []
+    for _ in range(count):
+        words = []
+        while sum(len(word) + 1 for word in words) < length:
+            words.append(random.choice(WORDS))
+        texts.append(" ".join(words)[:length])
+    return texts
+
+
+def make_keywords(count):
+    # Mostly keywords that don't occur, as in long lists of excluded words
+    return ["ausschluss{}".format(nr) for nr in range(count - 1)] + ["defekt"]
+
+
+def per_text(matcher, texts):
+    return min(timeit.repeat(lambda: [matcher.find(text) for text in texts], number = 1, repeat = 5)) / len(texts)
+
+
+def compare(count, texts):
+    keywords = make_keywords(count)
+    automaton = KeywordMatcher(keywords)
+    automaton._build_automaton()
+    search = KeywordMatcher(keywords)
+    search._transitions = None
+    assert [automaton.find(text) for text in texts] == [search.find(text) for text in texts]
+    return per_text(search, texts), per_text(automaton, texts)
+
+
+if __name__ == "__main__":
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    texts = make_texts(length)
+    crossover = None
+    print("{}-character texts, threshold {}".format(length, KeywordMatcher.automaton_threshold))
+    print("keywords      search   automaton")
+    for count in COUNTS:
+        search, automaton = compare(count, texts)
+        if crossover is None and automaton < search:
+            crossover = count
+        print("{:8d} {:9.1f}us {:9.1f}us".format(count, search * 1e6, automaton * 1e6))
+    print("The automaton is faster from {} keywords on".format(crossover))
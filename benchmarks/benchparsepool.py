@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Measures how many willhaben.at result pages per second a number of observers
+get through when pages are parsed in the server process and when they are
+parsed by a `ParsePool`. The pages are synthetic willhaben.at markup served
+by the local fixture server. Run from the repository root:
+
+    python3 -m benchmarks.benchparsepool [observers] [parse workers]
+"""
+
+import os
+import sys
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test"))
+
+from connector import Connector
+from parsepool import ParsePool
+from profiles.willhaben import WillhabenProfile
+from fixtures import FixtureServer, make_pages
+
+PAGES = 5
+ADS_PER_PAGE = 50
+
+AD_TEMPLATE = """
+<li class="media">
+  <a href="/iad/kaufen-und-verkaufen/d/ad-{id}/"><img src="http://cache.willhaben.at/{id}.jpg"/></a>
+  <div class="media-body">
+    <a id="{id}" name="{id}"></a>
+    <a href="/iad/kaufen-und-verkaufen/d/ad-{id}/"><span itemprop="name">{title}</span></a>
+    <p class="bot-1"><span>1010 Wien<br/>{datetime:%d.%m.%Y %H:%M}</span></p>
+    <p class="info-2">&euro; {price:.0f},-</p>
+    <p class="info-3">A description of {title}</p>
+  </div>
+</li>"""
+
+PAGE_TEMPLATE = """<html>
+<head><meta name="description" content="Marktplatz"/><title>willhaben</title></head>
+<body><ul id="resultlist">{}</ul></body>
+</html>"""
+
+
+class WillhabenFixtureServer(FixtureServer):
+
+    def render(self, page):
+        page -= 1   # willhaben.at pages start at 1
+        ads = self.pages[page] if 0 <= page < len(self.pages) else []
+        return PAGE_TEMPLATE.format("".join(AD_TEMPLATE.format(**tags) for tags in ads)).encode("ISO-8859-1")
+
+
+def throughput(server, observers, parser):
+    """
+    Polls all pages for each observer, `observers` at a time. Returns pages
+    per second.
+    """
+    timelimit = datetime.datetime(1970, 1, 1)
+    connectors = [Connector("{}?observer={}".format(server.url, nr), WillhabenProfile(), parser = parser)
+                  for nr in range(observers)]
+    start = time.time()
+    with ThreadPoolExecutor(max_workers = observers) as executor:
+        polls = list(executor.map(lambda connector: connector.ads_after(timelimit), connectors))
+    duration = time.time() - start
+    assert all(len(ads) > 0 for ads in polls)
+    return len(server.requests) / duration
+
+
+if __name__ == "__main__":
+    observers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    pages = make_pages(PAGES, ADS_PER_PAGE, newest = datetime.datetime.now().replace(second = 0, microsecond = 0))
+
+    server = WillhabenFixtureServer(pages)
+    in_process = throughput(server, observers, None)
+    server.requests = []
+    pool = ParsePool(workers)
+    pool.parse(WillhabenProfile(), server.render(1))     # start the workers
+    pooled = throughput(server, observers, pool)
+    pool.shutdown()
+    server.stop()
+
+    print("{} observers, {} pages of {} ads each, {} parse workers".format(observers, PAGES, ADS_PER_PAGE, workers))
+    print("in process: {:8.1f} pages/s".format(in_process))
+    print("parse pool: {:8.1f} pages/s".format(pooled))
@@ -26,6 +26,7 @@ SOFTWARE.
 
 import profiles
 from adstore import AdStore
+from sqlitestore import SqliteAdStore, migrate_pickle_store
 from adassessor import AdAssessor, AdCriterion
 from notificationserver import NotificationServer
 from observer import Observer
@@ -116,10 +117,25 @@ class SetConfig(Command):
         except KeyError:
             raise CommandError("Command is missing the `config` key")
         logging.debug("Setting configuration {}".format(config_values))
+        previous = _plain(self._server.config)
         try:
             self._server.config.update(config_values)
         except (FixedTreeError, TypeError) as error:
+            self._server.config.update(previous)
             raise CommandError("Structure does not comply with the config tree: {}".format(error.args[0]))
+        try:
+            self._server.apply_config()
+        except ValueError as error:
+            self._server.config.update(previous)
+            raise CommandError("Invalid configuration: {}".format(error.args[0]))
+
+
+def _plain(node):
+    """
+    Copies a config tree into plain dictionaries.
+    """
+    return {key: _plain(value) if isinstance(value, dict) else value for key, value in node.items()}
+
 
 class GetConfig(Command):
     """
@@ -150,25 +166,51 @@ class CreateObserverCommand(Command):
     def execute(self):
         logging.info("Setting up observer '{}'".format(self._cmd_info["name"]))
         profile = profiles.get_profile_by_name(self._cmd_info["profile"])
-        store = self._setup_store(self._cmd_info["store"])
         assessor = AdAssessor()
         for json in self._cmd_info["criteria"]:
             assessor.add_criterion(AdCriterion.from_json(json))
-        notification_server = NotificationServer()  # Add an empty notification server
+        if self._cmd_info["name"] in self._server.observers():
+            # The old observer's store must be closed before the new one opens its files
+            self._server.remove_observer(self._cmd_info["name"])
+        store = self._setup_store(self._cmd_info["store"])
+        notification_server = NotificationServer(self._server.dispatcher)  # Add an empty notification server
         observer = Observer(url=self._cmd_info["url"], profile=profile, # Setup the actual observer
                             store=store, assessor=assessor,
                             notifications=notification_server,
                             update_interval=self._cmd_info["interval"],
-                            name=self._cmd_info["name"])
+                            name=self._cmd_info["name"],
+                            min_interval=self._cmd_info.get("min_interval"),
+                            max_interval=self._cmd_info.get("max_interval"),
+                            feed=self._server.feeds.feed(self._cmd_info["url"], profile,
+                                                         prefetch=self._cmd_info.get("prefetch", 1)))
         
         self._server.add_observer(observer)
 
-    def _setup_store(self, persistent):
-        save_file = None    # Ads that have already been processed are registered in this file
-        if persistent:
-            if not os.path.exists("./store/"): os.mkdir("store")
-            save_file = "store/adstore.{}.db".format(self._cmd_info["name"])
-        return AdStore(path=save_file)
+    def _setup_store(self, options):
+        """
+        `options` is either a bool (persistent or not) or a dictionary. The
+        dictionary's `backend` can be "journal" (the default), "pickle" or
+        "sqlite". Retention is set with `max_age` (in seconds) and `max_count`.
+        """
+        if type(options) is not dict:
+            options = dict(backend="journal" if options else None)
+        backend = options.get("backend", "journal")
+        if backend not in (None, "journal", "pickle", "sqlite"):
+            raise CommandError("Unknown store backend: {}".format(backend))
+        retention = dict(max_age=options.get("max_age"), max_count=options.get("max_count"))
+        if backend is None:
+            return AdStore(**retention)
+
+        # Ads that have already been processed are registered in this file
+        if not os.path.exists("./store/"): os.mkdir("store")
+        save_file = "store/adstore.{}.db".format(self._cmd_info["name"])
+        if backend == "sqlite":
+            store = SqliteAdStore("store/adstore.{}.sqlite".format(self._cmd_info["name"]), **retention)
+            if os.path.exists(save_file):
+                logging.info("Migrating store {} to {}".format(save_file, store.path))
+                migrate_pickle_store(save_file, store)
+            return store
+        return AdStore(path=save_file, journal=backend == "journal", **retention)
 
 
 class AddNotificationCommand(Command):
@@ -184,8 +226,22 @@ class AddNotificationCommand(Command):
         notification = None
         if notification_type == "email":
             notification = self._setup_email_notification()
+        if "digest" in self._cmd_info:
+            notification = self._setup_digest(notification, self._cmd_info["digest"])
         self._server[observer_name].notifications.add_notification(notification)
 
+    def _setup_digest(self, notification, options):
+        """
+        Wraps `notification` so it collects ads for `options["window"]`
+        seconds and/or up to `options["count"]` ads and then sends them in
+        one message.
+        """
+        from notifications import DigestNotification
+        try:
+            return DigestNotification(notification, window=options.get("window"), count=options.get("count"))
+        except ValueError as error:
+            raise CommandError(error.args[0])
+
     def _setup_email_notification(self):
         try:
             header_from = self._cmd_info["from"]
@@ -198,6 +254,8 @@ class AddNotificationCommand(Command):
         smtp = self._server.config.smtp
         if type(header_to) == str:
             header_to = [header_to]   # make it a list
+        digest = self._cmd_info.get("digest", dict())   # templates for digest mails
+        digest_templates = {"digest_" + key: digest[key] for key in ("subject", "body", "item") if key in digest}
 
         from notifications import EmailNotification
         email_notification = EmailNotification(host=smtp["host"], port=smtp["port"],
@@ -205,7 +263,8 @@ class AddNotificationCommand(Command):
                                                pwd=smtp["pwd"],
                                                sender=header_from, to=header_to,
                                                mimetype=header_mime_type,
-                                               subject=header_subject, body=body)
+                                               subject=header_subject, body=body,
+                                               **digest_templates)
         return email_notification
 
 
@@ -279,6 +338,30 @@ class ObserverStateCommand(Command):
         return dict(state=observer_state)
 
 
+class ObserverStatsCommand(Command):
+    """
+    Returns the polling statistics of an observer
+    """
+    name = "observer_stats"
+
+    def execute(self):
+        observer_name = self._cmd_info["name"]
+        try:
+            return self._server[observer_name].stats
+        except KeyError:
+            raise CommandError("Observer {} not found.".format(observer_name))
+
+
+class NotificationStatsCommand(Command):
+    """
+    Returns the queue depth and delivery statistics of the notifications
+    """
+    name = "notification_stats"
+
+    def execute(self):
+        return self._server.dispatcher.stats
+
+
 class GetObserverCommand(Command):
     """
     Returns a list of all observers that are currently running.
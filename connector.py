@@ -24,16 +24,29 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-from adstore import Ad
-import urllib.request, urllib.error, urllib.parse
+from adstore import CompactAd
+import http.client
+import zlib
 import re
 import datetime
 import profiles
 import logging
+import httppool
+import asynchttp
+import asyncio
+import ratelimit
+import urllib.parse
+from itertools import islice
+import hashlib
+from threading import Lock
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 class ConnectionError(Exception): pass
 
 class Connector():
+
+    throttle_retries = 1    # how often a request answered with 429/503 is queued again
     
     @property
     def profile_name(self):
@@ -43,7 +56,23 @@ class Connector():
     def url(self):
         return self._url
     
-    def __init__(self, url, profile):
+    def __init__(self, url, profile, pool = None, prefetch = 1, parse_cache_size = 16, limiter = None,
+                 async_pool = None, parser = None):
+        """
+        Pages are fetched over the keep-alive connections of `pool`. By
+        default all connectors share `httppool.shared_pool`, or
+        `asynchttp.shared_pool` (`async_pool`) when polled with
+        ads_after_async(). Requests are queued by the per-host `limiter`, by
+        default `ratelimit.shared_limiter`. With `prefetch` > 1 ads_after()
+        fetches up to that many pages in parallel. The tags of the last
+        `parse_cache_size` distinct pages are cached, so a page that did not
+        change is not parsed again. Pages are parsed by `parser` (a
+        `parsepool.ParsePool`) if given, otherwise in this process.
+
+        Polls made with `conditional` set (as `feed.SharedFeed` does) send
+        the validators of the previous conditional poll, so pages that did
+        not change since are not transferred again.
+        """
         m = re.match(r"(http://)?([a-zA-Z0-9-.]+)?([a-zA-Z0-9-._/?=&%]*)", url)
         if m is None:
             raise Exception("Invalid URL: {}".format(url))
@@ -52,25 +81,188 @@ class Connector():
             self._profile = profile
         elif isinstance(profile, str):
             self._profile = profiles.get_profile_by_name(profile)
+        self._pool = pool or httppool.shared_pool
+        self._async_pool = async_pool or asynchttp.shared_pool
+        self._parser = parser
+        self._prefetch = max(1, prefetch)
+        self._validators = dict()   # page URL -> (ETag, Last-Modified)
+        self._page_size = 0         # the most ads seen on one page
+        self._parse_cache = OrderedDict()   # (page URL, fingerprint) -> [tags, ...]
+        self._parse_cache_size = parse_cache_size
+        self._parse_cache_hits = 0
+        self._parse_cache_misses = 0
+        self._parse_cache_lock = Lock()
+        self._limiter = limiter or ratelimit.shared_limiter
+        self._queue_delay = 0.0         # seconds requests were queued by the limiter in total
+        self._poll_queue_delay = 0.0    # ... during the last poll
+        self._queue_delay_lock = Lock()
 
-    def _get_page(self, page):
-        data = None
-        url = self._url
-        url = self._profile.first_page(url)
-        for i in range(0, page, 1):
+    @property
+    def page_size(self):
+        """
+        The number of ads on a full page, as far as seen so far.
+        """
+        return self._page_size
+
+    @property
+    def prefetch(self):
+        """
+        The number of page requests ads_after() keeps in flight.
+        """
+        return self._prefetch
+
+    @prefetch.setter
+    def prefetch(self, value):
+        self._prefetch = max(1, value)
+
+    @property
+    def parse_cache_stats(self):
+        return dict(hits=self._parse_cache_hits, misses=self._parse_cache_misses)
+
+    @property
+    def queue_delay(self):
+        """
+        The seconds requests were queued by the rate limiter during the last
+        poll and in total.
+        """
+        return dict(last_poll=self._poll_queue_delay, total=self._queue_delay)
+
+    def _record_queue_delay(self, host, delay):
+        if delay > 0:
+            with self._queue_delay_lock:
+                self._poll_queue_delay += delay
+                self._queue_delay += delay
+            logging.debug("Request to {} was queued for {:.2f}s".format(host, delay))
+
+    def forget_validators(self):
+        """
+        Makes the next conditional poll fetch every page. Required when
+        polling for ads older than those of the previous poll.
+        """
+        self._validators.clear()
+
+    def _request(self, url, conditional = False):
+        """
+        Requests a compressed page. If `conditional` is set the request is
+        conditional on the validators of the last response for this URL and
+        the response's status might be 304 (not modified).
+        """
+        headers = self._request_headers(url, conditional)
+        host = urllib.parse.urlsplit(url).hostname
+        for attempt in range(self.throttle_retries + 1):
+            self._record_queue_delay(host, self._limiter.acquire(host))
+            try:
+                response = self._pool.request(url, headers)
+            except (http.client.HTTPException, OSError, ValueError):
+                raise ConnectionError("Could not connect to {}".format(url))
+            if not self._throttled(host, response, attempt):
+                break
+        return self._checked(url, response)
+
+    async def _request_async(self, url, conditional = False):
+        """
+        The coroutine version of _request().
+        """
+        headers = self._request_headers(url, conditional)
+        host = urllib.parse.urlsplit(url).hostname
+        for attempt in range(self.throttle_retries + 1):
+            delay = self._limiter.reserve(host)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._record_queue_delay(host, delay)
+            try:
+                response = await self._async_pool.request(url, headers)
+            except (http.client.HTTPException, OSError, ValueError):
+                raise ConnectionError("Could not connect to {}".format(url))
+            if not self._throttled(host, response, attempt):
+                break
+        return self._checked(url, response)
+
+    def _request_headers(self, url, conditional):
+        headers = {"Accept-Encoding": "gzip, deflate"}
+        if conditional and url in self._validators:
+            etag, last_modified = self._validators[url]
+            if etag: headers["If-None-Match"] = etag
+            if last_modified: headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def _throttled(self, host, response, attempt):
+        """
+        Tells if the host throttled the request and it should be queued once
+        more. The host is backed off in that case.
+        """
+        if response.status not in (429, 503) or attempt == self.throttle_retries:
+            return False
+        self._limiter.penalize(host, self._retry_after(response))
+        return True
+
+    @staticmethod
+    def _checked(url, response):
+        if response.status >= 400:
+            raise ConnectionError("Could not fetch {} (HTTP status {})".format(url, response.status))
+        return response
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return min(60.0, max(0.0, float(response.headers.get("Retry-After"))))
+        except (TypeError, ValueError):
+            return 5.0
+
+    def _decoded_body(self, response):
+        try:
+            return response.decoded_body()
+        except (OSError, EOFError, zlib.error):
+            raise ConnectionError("Could not decode the response from {}".format(response.url))
+
+    def _fetch(self, url):
+        return str(self._decoded_body(self._request(url)), self._profile.encoding)
+
+    def _parse_page(self, url, response):
+        """
+        Returns the tags of all ads on a page. Pages are identified by their
+        URL and a fingerprint (hash) of their content.
+        """
+        body = self._decoded_body(response)
+        cache_key = (url, hashlib.sha1(body).digest())
+        with self._parse_cache_lock:
+            tags = self._parse_cache.get(cache_key)
+            if tags is not None:
+                self._parse_cache.move_to_end(cache_key)
+                self._parse_cache_hits += 1
+                logging.debug("Connector skips parsing unchanged page {}".format(url))
+                return tags
+            self._parse_cache_misses += 1
+        if self._parser is not None:
+            tags = self._parser.parse(self._profile, body)
+        else:
+            tags = list(self._profile.parse(str(body, self._profile.encoding)))
+        with self._parse_cache_lock:
+            self._parse_cache[cache_key] = tags
+            while len(self._parse_cache) > self._parse_cache_size:
+                self._parse_cache.popitem(last = False)
+        return tags
+
+    def _page_urls(self):
+        """
+        Yields the URL of each page, starting with the first one. Each URL is
+        derived from the previous one, so walking N pages costs N calls of
+        `next_page`.
+        """
+        url = self._profile.first_page(self._url)
+        while True:
+            yield url
             next_url = self._profile.next_page(url)
             if next_url == url:
-                raise IndexError("Page {} does not exist".format(page))
+                return
             url = next_url
-        try:
-            logging.debug("Connnector fetching page {} from URL: {}".format(page, url))
-            f = urllib.request.urlopen(url, data)
-        except (urllib.error.URLError, ValueError):
-            raise ConnectionError("Could not connect to {}".format(url))
-        
-        html = str(f.read(), self._profile.encoding)
-        f.close()
-        return html
+
+    def _get_page(self, page):
+        url = next(islice(self._page_urls(), page, None), None)
+        if url is None:
+            raise IndexError("Page {} does not exist".format(page))
+        logging.debug("Connnector fetching page {} from URL: {}".format(page, url))
+        return self._fetch(url)
 
     def frontpage_ads(self):
         try:
@@ -89,21 +281,103 @@ class Connector():
         timelimit = datetime.datetime.now() - dtime
         return self.ads_after(timelimit, maxpages)
     
-    def ads_after(self, timelimit, maxpages = 100):
+    def ads_after(self, timelimit, maxpages = 100, conditional = False):
+        """
+        Returns the ads newer than `timelimit`. With `conditional` set, the
+        walk stops at the first page that did not change since the last
+        conditional poll.
+        """
         if not isinstance(timelimit, datetime.datetime):
             raise ConnectionError("timelimit needs to be a datetime instance")
         ads = []
-        for page in range(0, maxpages):
-            try:
-                html = self._get_page(page)
-            except IndexError:
-                break
-            new_ads = [Ad(tags, self._profile.key_tag, self._profile.datetime_tag)
-                       for tags in self._profile.parse(html)
-                       if tags[self._profile.datetime_tag] > timelimit]
+        validators = dict()
+        self._poll_queue_delay = 0.0
+        if self._prefetch > 1:
+            pages = self._prefetched_pages(maxpages, conditional)
+        else:
+            pages = self._pages(maxpages, conditional)
+        try:
+            for url, response in pages:
+                new_ads = self._page_ads(url, response, timelimit, validators)
+                if not new_ads:
+                    break
+                ads.extend(new_ads)
+        finally:
+            pages.close()
 
-            if len(new_ads) == 0:
+        # Only remember validators after a successful conditional poll.
+        # Otherwise a page that was never processed by the poller could be
+        # reported as not modified later.
+        if conditional:
+            self._validators.update(validators)
+        return ads
+
+    async def ads_after_async(self, timelimit, maxpages = 100, executor = None, conditional = False):
+        """
+        The coroutine version of ads_after(). Pages are fetched one after
+        another; parsing runs in `executor` (the loop's default executor if
+        `None`) so it doesn't block the event loop.
+        """
+        if not isinstance(timelimit, datetime.datetime):
+            raise ConnectionError("timelimit needs to be a datetime instance")
+        loop = asyncio.get_running_loop()
+        ads = []
+        validators = dict()
+        self._poll_queue_delay = 0.0
+        for page, url in zip(range(maxpages), self._page_urls()):
+            logging.debug("Connnector fetching page {} from URL: {}".format(page, url))
+            response = await self._request_async(url, conditional)
+            new_ads = await loop.run_in_executor(executor, self._page_ads, url, response, timelimit, validators)
+            if not new_ads:
                 break
             ads.extend(new_ads)
-
+        if conditional:
+            self._validators.update(validators)
         return ads
+
+    def _page_ads(self, url, response, timelimit, validators):
+        """
+        Returns the ads on a page that are newer than `timelimit`, or `None`
+        if the page was not modified. The page's validators are added to
+        `validators`.
+        """
+        if response.status == 304:
+            return None     # Not modified. Everything on this page has been seen before.
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            validators[url] = (etag, last_modified)
+        page_tags = self._parse_page(url, response)
+        self._page_size = max(self._page_size, len(page_tags))
+        return [CompactAd(tags, self._profile.key_tag, self._profile.datetime_tag)
+                for tags in page_tags
+                if tags[self._profile.datetime_tag] > timelimit]
+
+    def _pages(self, maxpages, conditional):
+        for page, url in zip(range(maxpages), self._page_urls()):
+            logging.debug("Connnector fetching page {} from URL: {}".format(page, url))
+            yield url, self._request(url, conditional)
+
+    def _prefetched_pages(self, maxpages, conditional):
+        """
+        Like _pages() but keeps up to `prefetch` requests in flight while the
+        caller parses the pages it already got. Requests that were not sent
+        yet are cancelled when the caller stops early.
+        """
+        prefetch = self._prefetch
+        executor = ThreadPoolExecutor(max_workers = prefetch)
+        pending = deque()
+        try:
+            for page, url in zip(range(maxpages), self._page_urls()):
+                logging.debug("Connnector prefetching page {} from URL: {}".format(page, url))
+                pending.append((url, executor.submit(self._request, url, conditional)))
+                if len(pending) >= prefetch:
+                    url, future = pending.popleft()
+                    yield url, future.result()
+            while pending:
+                url, future = pending.popleft()
+                yield url, future.result()
+        finally:
+            for url, future in pending:
+                future.cancel()
+            executor.shutdown(wait = False)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from bisect import bisect_left, bisect_right
+from threading import RLock
+
+from adassessor import (AdCriterionLessThan, AdCriterionGreaterThan, AdCriterionKeywordsAll,
+                        AdCriterionKeywordsAny)
+from keywordmatcher import KeywordMatcher
+
+
+class CriteriaIndex(object):
+    """
+    Routes ads to the assessors (usually one per observer) they match. Instead
+    of running every assessor on every ad, each assessor is indexed by one of
+    its criteria:
+
+    * keywords_any / keywords_all: an inverted keyword index per tag. The
+      texts are scanned once for the keywords of all assessors.
+    * less_than / greater_than: sorted limits per tag, searched by bisection.
+
+    Only the assessors found this way (and those without any of these
+    criteria) run their full check. The cost per ad therefore grows with the
+    number of candidates, not with the number of assessors.
+    """
+
+    def __init__(self):
+        self._assessors = dict()
+        self._lock = RLock()
+        self._built = False
+
+    def add(self, key, assessor):
+        with self._lock:
+            self._assessors[key] = assessor
+            self._built = False
+
+    def remove(self, key):
+        with self._lock:
+            del self._assessors[key]
+            self._built = False
+
+    def __len__(self):
+        return len(self._assessors)
+
+    def __contains__(self, key):
+        return key in self._assessors
+
+    @staticmethod
+    def _routing_criterion(assessor):
+        """
+        Picks the criterion an assessor is indexed by. Keyword criteria are
+        the most selective, so they are preferred.
+        """
+        for types in [(AdCriterionKeywordsAny, AdCriterionKeywordsAll),
+                      (AdCriterionLessThan, AdCriterionGreaterThan)]:
+            for criterion in assessor.criteria:
+                if type(criterion) in types:
+                    return criterion
+        return None
+
+    def _build(self):
+        keywords = dict()   # tagname -> {lowered keyword: [key, ...]}
+        less_than = dict()  # tagname -> [(limit, key), ...]
+        greater_than = dict()
+        self._unconditional = []
+        for key, assessor in self._assessors.items():
+            criterion = self._routing_criterion(assessor)
+            if isinstance(criterion, AdCriterionKeywordsAll):
+                # An ad can only match if it contains the longest keyword
+                longest = max(criterion.keywords, key = len, default = "").lower()
+                keywords.setdefault(criterion.tagname, dict()).setdefault(longest, []).append(key)
+            elif isinstance(criterion, AdCriterionKeywordsAny):
+                for keyword in set(kwd.lower() for kwd in criterion.keywords):
+                    keywords.setdefault(criterion.tagname, dict()).setdefault(keyword, []).append(key)
+            elif isinstance(criterion, AdCriterionLessThan):
+                less_than.setdefault(criterion.tagname, []).append((criterion.limit, key))
+            elif isinstance(criterion, AdCriterionGreaterThan):
+                greater_than.setdefault(criterion.tagname, []).append((criterion.limit, key))
+            else:
+                self._unconditional.append(key)
+
+        self._keyword_routes = []   # [(tagname, matcher, [[key, ...], ...]), ...]
+        for tagname, postings in keywords.items():
+            self._keyword_routes.append((tagname, KeywordMatcher(list(postings.keys())), list(postings.values())))
+        self._threshold_routes = []     # [(tagname, is_less_than, [limit, ...], [key, ...]), ...]
+        for is_less_than, routes in [(True, less_than), (False, greater_than)]:
+            for tagname, entries in routes.items():
+                entries.sort(key = lambda entry: entry[0])
+                self._threshold_routes.append((tagname, is_less_than,
+                                               [entry[0] for entry in entries], [entry[1] for entry in entries]))
+        self._built = True
+
+    def _candidates(self, ad):
+        candidates = set(self._unconditional)
+        for tagname, matcher, postings in self._keyword_routes:
+            found = matcher.find(ad[tagname].lower())
+            while found:
+                lowest = found & -found
+                candidates.update(postings[lowest.bit_length() - 1])
+                found ^= lowest
+        for tagname, is_less_than, limits, keys in self._threshold_routes:
+            value = ad[tagname]
+            if is_less_than:
+                candidates.update(keys[bisect_left(limits, value):])     # limit >= value
+            else:
+                candidates.update(keys[:bisect_right(limits, value)])    # limit <= value
+        return candidates
+
+    def match(self, ad):
+        """
+        Returns the keys of all assessors that match `ad`.
+        """
+        with self._lock:
+            if not self._built:
+                self._build()
+            return [key for key in self._candidates(ad) if self._assessors[key].check(ad)]
+
+    def match_batch(self, ads, keys = None):
+        """
+        Returns a dictionary that maps every key (or only `keys`) to a list
+        of booleans, one per ad, like `AdAssessor.check_batch()`. Each
+        assessor runs check_batch() on the ads routed to it.
+        """
+        with self._lock:
+            if not self._built:
+                self._build()
+            keys = self._assessors.keys() if keys is None else [key for key in keys if key in self._assessors]
+            candidates = {key: [] for key in keys}     # key -> indices of the ads routed to it
+            for i, ad in enumerate(ads):
+                for key in self._candidates(ad):
+                    if key in candidates:
+                        candidates[key].append(i)
+            masks = dict()
+            for key, indices in candidates.items():
+                mask = [False] * len(ads)
+                if indices:
+                    hits = self._assessors[key].check_batch([ads[i] for i in indices])
+                    for i, hit in zip(indices, hits):
+                        mask[i] = hit
+                masks[key] = mask
+            return masks
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+import asyncio
+import weakref
+import logging
+from threading import Lock
+
+from connector import Connector
+from criteriaindex import CriteriaIndex
+
+
+class SharedFeed(object):
+    """
+    Polls one URL on behalf of all subscribed observers. Every poll fetches
+    the ads that are new to the subscriber with the oldest time mark, parses
+    them once and hands each running subscriber the ads newer than its own
+    time mark. If a poll serves several subscribers, their assessors are
+    looked up in a `CriteriaIndex`, so each ad is only checked by the
+    assessors it may match.
+    """
+
+    def __init__(self, connector):
+        self._connector = connector
+        self._subscribers = list()
+        self._delivered = dict()    # observer -> time of the last delivery
+        self._polls = 0             # number of successful polls
+        self._served = dict()       # observer -> number of the last poll it received
+        self._index = CriteriaIndex()   # observer -> its assessor
+        self._lock = Lock()         # guards the subscribers
+        self._poll_lock = Lock()
+        self._async_poll_lock = None
+
+    @property
+    def connector(self):
+        return self._connector
+
+    @property
+    def subscribers(self):
+        return list(self._subscribers)
+
+    def subscribe(self, observer):
+        with self._lock:
+            if observer not in self._subscribers:
+                self._subscribers.append(observer)
+                if observer.assessor is not None:
+                    self._index.add(observer, observer.assessor)
+
+    def unsubscribe(self, observer):
+        with self._lock:
+            if observer in self._subscribers:
+                self._subscribers.remove(observer)
+            if observer in self._index:
+                self._index.remove(observer)
+            self._delivered.pop(observer, None)
+            self._served.pop(observer, None)
+
+    def poll(self, observer):
+        """
+        Polls for new ads unless `observer` already received ads from a poll
+        within its update interval. Returns `True` if the URL was fetched.
+        """
+        with self._poll_lock:
+            subscribers, time_mark = self._poll_targets(observer)
+            if not subscribers:
+                return False
+            ads = self._connector.ads_after(time_mark, conditional = True)
+            observer._record_queue_delay(self._connector.queue_delay["last_poll"])
+            self._deliver(observer, subscribers, ads)
+            return True
+
+    async def poll_async(self, observer, executor = None):
+        """
+        The coroutine version of poll(). The ads are processed in `executor`
+        (the loop's default executor if `None`).
+        """
+        if self._async_poll_lock is None:
+            self._async_poll_lock = asyncio.Lock()
+        async with self._async_poll_lock:
+            subscribers, time_mark = self._poll_targets(observer)
+            if not subscribers:
+                return False
+            ads = await self._connector.ads_after_async(time_mark, executor = executor, conditional = True)
+            observer._record_queue_delay(self._connector.queue_delay["last_poll"])
+            await asyncio.get_running_loop().run_in_executor(executor, self._deliver, observer, subscribers, ads)
+            return True
+
+    def _poll_targets(self, observer):
+        """
+        Returns the subscribers a poll for `observer` serves and the time
+        mark to poll with. No subscribers if the poll can be skipped.
+        """
+        with self._lock:
+            delivered = self._delivered.get(observer)
+            if delivered is not None and time.monotonic() - delivered < observer.interval:
+                logging.debug("Observer '{}' was served by a shared poll".format(observer.name))
+                return [], None
+            subscribers = [subscriber for subscriber in self._subscribers
+                           if subscriber is observer or subscriber.state == subscriber.RUNNING]
+            missed_polls = any(self._served.get(subscriber) != self._polls for subscriber in subscribers)
+        if not subscribers:
+            return [], None
+        if missed_polls:
+            # A subscriber that joined late or was paused hasn't seen the ads
+            # on pages that are unchanged since the last poll.
+            self._connector.forget_validators()
+        return subscribers, min(subscriber.time_mark for subscriber in subscribers)
+
+    def _deliver(self, observer, subscribers, ads):
+        now = time.monotonic()
+        with self._lock:
+            self._polls += 1
+            poll = self._polls
+        masks = dict()
+        if len(subscribers) > 1:
+            masks = self._index.match_batch(ads, subscribers)
+        for subscriber in subscribers:
+            new = [i for i, ad in enumerate(ads) if ad.datetime > subscriber.time_mark]
+            new_ads = [ads[i] for i in new]
+            mask = masks.get(subscriber)
+            hits = [mask[i] for i in new] if mask is not None else None
+            try:
+                subscriber._process_ads(new_ads, hits)
+            except Exception:
+                if subscriber is observer:
+                    raise
+                logging.exception("Observer '{}' failed to process shared ads".format(subscriber.name))
+                continue
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._delivered[subscriber] = now
+                    self._served[subscriber] = poll
+
+
+class FeedRegistry(object):
+    """
+    Hands out one `SharedFeed` per (url, profile) pair. A feed lives as long
+    as one of its observers holds on to it. The feeds' connectors parse pages
+    with `parser` (see `Connector`).
+    """
+
+    def __init__(self, parser = None):
+        self._parser = parser
+        self._feeds = weakref.WeakValueDictionary()
+        self._lock = Lock()
+
+    def feed(self, url, profile, prefetch = 1):
+        """
+        Returns the feed for `url` and `profile`. Its connector prefetches the
+        most pages any of the feed's observers asked for.
+        """
+        key = (url, profile.name)
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is None:
+                feed = SharedFeed(Connector(url, profile, prefetch = prefetch, parser = self._parser))
+                self._feeds[key] = feed
+            else:
+                feed.connector.prefetch = max(feed.connector.prefetch, prefetch)
+            return feed
+
+    def __len__(self):
+        return len(self._feeds)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+import gzip
+import zlib
+import http.client
+import urllib.parse
+from collections import deque
+from threading import Lock
+
+
+class Response(object):
+    """
+    A fully read HTTP response.
+    """
+
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def decoded_body(self):
+        """
+        The body with its Content-Encoding (gzip or deflate) removed.
+        """
+        encoding = (self.headers.get("Content-Encoding") or "identity").strip().lower()
+        if encoding == "gzip":
+            return gzip.decompress(self.body)
+        if encoding == "deflate":
+            try:
+                return zlib.decompress(self.body)
+            except zlib.error:
+                return zlib.decompress(self.body, -zlib.MAX_WBITS)  # raw deflate without zlib header
+        return self.body
+
+
+class ConnectionPool(object):
+    """
+    Keeps HTTP connections alive and reuses them for further requests to the
+    same host. Up to `max_size` idle connections are kept per host. A
+    connection that was idle for more than `idle_timeout` seconds is closed
+    instead of being reused. The pool is thread-safe; connections are never
+    shared by two requests at the same time.
+    """
+
+    # Errors that tell us the server closed a kept-alive connection
+    _stale_errors = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                     BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+    _redirects = (301, 302, 303, 307, 308)
+
+    def __init__(self, max_size = 4, idle_timeout = 30.0, timeout = 30.0):
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._idle = dict()     # (scheme, host, port) -> deque([(connection, last used), ...])
+        self._lock = Lock()
+
+    def configure(self, max_size = None, idle_timeout = None):
+        with self._lock:
+            if max_size is not None: self._max_size = max_size
+            if idle_timeout is not None: self._idle_timeout = idle_timeout
+
+    def _acquire(self, origin):
+        """
+        Returns an idle connection to `origin` or a new one. The second return
+        value tells if the connection is reused.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(origin)
+            while idle:
+                connection, last_used = idle.pop()
+                if now - last_used <= self._idle_timeout:
+                    return connection, True
+                connection.close()
+        scheme, host, port = origin
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return connection_class(host, port, timeout = self._timeout), False
+
+    def _release(self, origin, connection):
+        with self._lock:
+            idle = self._idle.setdefault(origin, deque())
+            if len(idle) < self._max_size:
+                idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def close(self):
+        """
+        Closes all idle connections.
+        """
+        with self._lock:
+            for idle in self._idle.values():
+                for connection, _ in idle:
+                    connection.close()
+            self._idle.clear()
+
+    def _send(self, origin, path, headers):
+        while True:
+            connection, reused = self._acquire(origin)
+            try:
+                connection.request("GET", path, headers = headers)
+                response = connection.getresponse()
+                body = response.read()
+            except self._stale_errors:
+                connection.close()
+                if reused:
+                    continue    # The server closed the idle connection. Try a fresh one.
+                raise
+            except:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(origin, connection)
+            return response, body
+
+    def request(self, url, headers = None, max_redirects = 5):
+        """
+        Sends a GET request and returns a `Response`. Redirects are followed.
+        Raises `http.client.HTTPException` or `OSError` if the request fails.
+        """
+        for _ in range(max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                raise ValueError("Unsupported URL: {}".format(url))
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+            response, body = self._send((parts.scheme, parts.hostname, port), path, headers or dict())
+            location = response.getheader("Location")
+            if response.status not in self._redirects or location is None:
+                return Response(url, response.status, response.headers, body)
+            url = urllib.parse.urljoin(url, location)
+        raise http.client.HTTPException("Too many redirects")
+
+
+shared_pool = ConnectionPool()
@@ -25,6 +25,7 @@ SOFTWARE.
 """
 
 from server import Server
+from runtime import runtimes
 from api.jsonscript import JsonScript
 
 import sys
@@ -42,6 +43,11 @@ if __name__ == "__main__":
     verbosity = dict(DEBUG=logging.DEBUG, INFO=logging.INFO, SILENT=100)
     parser.add_argument("-v", "--verbosity", type=str, choices=verbosity.keys(), default="INFO",
                         help="Set verbosity (Default is INFO)")
+    parser.add_argument("-r", "--runtime", type=str, choices=runtimes.keys(), default="scheduler",
+                        help="Poll observers from a central scheduler, run each observer in a thread or all "
+                             "of them on an asyncio event loop (Default is scheduler)")
+    parser.add_argument("-p", "--parse-workers", type=int, default=0,
+                        help="Parse pages in this many worker processes (Default is 0, parse in the server process)")
     args = parser.parse_args()
 
     # Setup logging
@@ -51,7 +57,7 @@ if __name__ == "__main__":
     logging.getLogger().addHandler(logging.StreamHandler())
 
     # Start the engines!
-    server = Server()
+    server = Server(runtime=runtimes[args.runtime](), parse_workers=args.parse_workers)
     server.daemon = True
     server.start()
         
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from collections import deque
+
+
+class KeywordMatcher(object):
+    """
+    Finds which of a set of keywords occur in a text with a single pass over
+    the text (Aho-Corasick). The automaton is built once. Every state has a
+    complete transition table, so scanning is one dictionary lookup per
+    character. Matching is case sensitive; callers lowercase text and
+    keywords themselves.
+
+    The automaton runs in Python, one character at a time. For short keyword
+    lists it is faster to let str search for each keyword, so the automaton
+    is only used from `automaton_threshold` keywords on. For texts of about
+    600 characters benchmarks/benchkeywordmatcher.py puts the crossover
+    between 160 and 192 keywords.
+    """
+
+    automaton_threshold = 192
+
+    def __init__(self, keywords):
+        self._keywords = list(keywords)
+        self._all = (1 << len(self._keywords)) - 1
+        self._transitions = None
+        if len(self._keywords) >= self.automaton_threshold:
+            self._build_automaton()
+
+    def _build_automaton(self):
+        goto = [dict()]
+        output = [0]    # bit i is set if keyword i ends in this state
+        for i, keyword in enumerate(self._keywords):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append(dict())
+                    output.append(0)
+                state = next_state
+            output[state] |= 1 << i
+
+        # Breadth first: the failure state of a state is always closer to the
+        # root, so its transitions and output are complete when needed.
+        transitions = [None] * len(goto)
+        transitions[0] = dict(goto[0])
+        queue = deque()
+        for next_state in goto[0].values():
+            queue.append((next_state, 0))
+        while queue:
+            state, fail = queue.popleft()
+            output[state] |= output[fail]
+            transitions[state] = dict(transitions[fail])
+            transitions[state].update(goto[state])
+            for char, next_state in goto[state].items():
+                queue.append((next_state, transitions[fail].get(char, 0)))
+        self._transitions = transitions
+        self._output = output
+
+    @property
+    def keywords(self):
+        return self._keywords
+
+    def find(self, text, stop = None):
+        """
+        Returns a bit mask of the keywords that occur in `text`. Bit i stands
+        for keyword i. Scanning stops early as soon as all bits in `stop` are
+        found.
+        """
+        if stop is None:
+            stop = self._all
+        if self._transitions is None:
+            return self._find_each(text, stop)
+        transitions = self._transitions
+        output = self._output
+        found = output[0]   # the empty keyword is in every text
+        state = 0
+        for char in text:
+            state = transitions[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+                if found & stop == stop:
+                    break
+        return found
+
+    def _find_each(self, text, stop):
+        found = 0
+        for i, keyword in enumerate(self._keywords):
+            if keyword in text:
+                found |= 1 << i
+                if found & stop == stop:
+                    break
+        return found
+
+    def contains_any(self, text):
+        return self.find(text, stop = 0) != 0
+
+    def contains_all(self, text):
+        return self.find(text) == self._all
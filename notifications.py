@@ -26,8 +26,12 @@ SOFTWARE.
 
 import smtplib
 import re
+import time
 import logging
 
+from threading import Lock, Timer
+from collections import deque
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.header import Header
 
@@ -38,17 +42,129 @@ class NotificationError(Exception):pass
 class Notification:
     def notify(self, ad):
         raise NotImplementedError("notify() must be implemented in subclass.")
+
+    def notify_batch(self, ads):
+        """
+        Notifies about all `ads` found by one poll. Override this method if
+        the notification can handle several ads more efficiently at once.
+        """
+        for ad in ads:
+            self.notify(ad)
+
+    def notify_digest(self, ads):
+        """
+        Notifies about `ads` in a single message, if the notification type
+        supports that. Called by `DigestNotification`.
+        """
+        self.notify_batch(ads)
+
+    def flush(self):
+        """
+        Delivers everything the notification holds back.
+        """
+        pass
     
     def serialize(self):
         raise NotImplementedError("serialize() must be implemented in subclass.")
     
     
+class SmtpSessionPool:
+    """
+    Keeps one logged in SMTP session per (host, port, user) open between
+    notifications. Before a session is reused it is probed with NOOP; a
+    session that failed, was idle for longer than `idle_timeout` seconds or
+    doesn't answer the probe is replaced by a new one.
+    """
+
+    def __init__(self, idle_timeout=60.0):
+        self._idle_timeout = idle_timeout
+        self._sessions = dict()     # (host, port, user) -> [session lock, smtplib.SMTP, last used]
+        self._lock = Lock()
+
+    def _connect(self, host, port, auth, user, pwd):
+        server = smtplib.SMTP(host, port)
+        try:
+            server.starttls()
+        except smtplib.SMTPException:
+            logging.debug("The SMTP server does not support STARTTLS")
+        if auth:
+            server.login(user, pwd)
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except:
+            server.close()
+
+    def _usable(self, server, last_used):
+        if time.monotonic() - last_used > self._idle_timeout:
+            return False
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @contextmanager
+    def session(self, host, port, auth=False, user=None, pwd=None):
+        """
+        Yields an SMTP session for exclusive use within the `with` block.
+        """
+        key = (host, port, user if auth else None)
+        with self._lock:
+            entry = self._sessions.setdefault(key, [Lock(), None, 0.0])
+        with entry[0]:
+            server = entry[1]
+            entry[1] = None
+            if server is not None and not self._usable(server, entry[2]):
+                logging.debug("Reconnecting to SMTP server {}".format(host))
+                self._close(server)
+                server = None
+            if server is None:
+                server = self._connect(host, port, auth, user, pwd)
+            try:
+                yield server
+            except (smtplib.SMTPException, OSError):
+                self._close(server)
+                raise
+            finally:
+                if server.sock is not None:
+                    entry[1] = server
+                    entry[2] = time.monotonic()
+
+    def close(self):
+        """
+        Closes all sessions.
+        """
+        with self._lock:
+            entries = list(self._sessions.values())
+            self._sessions.clear()
+        for entry in entries:
+            with entry[0]:
+                if entry[1] is not None:
+                    self._close(entry[1])
+                    entry[1] = None
+
+
+smtp_pool = SmtpSessionPool()
+
+
 class EmailNotification(Notification):
     """
-    Sends email notification using python's smtplib module
+    Sends email notification using python's smtplib module. The SMTP sessions
+    are kept open in `pool` (`smtp_pool` by default) between notifications.
     """
 
-    def __init__(self, host, port, sender, to, subject, body, auth=False, user=None, pwd=None, mimetype="text/plain"):
+    def __init__(self, host, port, sender, to, subject, body, auth=False, user=None, pwd=None, mimetype="text/plain",
+                 pool=None, digest_subject="{count} new ads", digest_body="{ads}", digest_item=None):
+        """
+        `subject` and `body` are formatted with the tags of an ad. A digest
+        mail (see notify_digest()) is made of `digest_subject` and
+        `digest_body`, formatted with the number of ads as `count` and all
+        ads as `ads`. `ads` is `digest_item` (the per-ad `body` by default)
+        formatted with the tags of each ad.
+        """
         self._host = host
         self._port = port
         self._auth = auth
@@ -59,6 +175,10 @@ class EmailNotification(Notification):
         self._subject = subject
         self._body = body
         self._mimetype = mimetype
+        self._pool = pool or smtp_pool
+        self._digest_subject = digest_subject
+        self._digest_body = digest_body
+        self._digest_item = digest_item
 
     def _get_mime_string(self, to, subject, body):
         match = re.match("text/(.+)", self._mimetype)
@@ -80,20 +200,55 @@ class EmailNotification(Notification):
             raise NotificationError("Profile doesn't support tagname '{}'".format(expn.args[0]))
         return msg
 
+    def _get_digest_mail(self, ads, to):
+        if self._digest_item is not None:
+            item, separator = self._digest_item, ""
+        else:
+            item, separator = self._body, "\n\n" if self._mimetype == "text/plain" else "<hr/>\n"
+        try:
+            items = separator.join(item.format(**ad) for ad in ads)
+            subject = self._digest_subject.format(count=len(ads))
+            body = self._digest_body.format(count=len(ads), ads=items)
+        except KeyError as expn:
+            raise NotificationError("Digest doesn't support tagname '{}'".format(expn.args[0]))
+        return self._get_mime_string(to, subject, body)
+
     def notify(self, ad):
-        server = None
+        self.notify_batch([ad])
+
+    def notify_batch(self, ads):
+        """
+        Sends the mails for all `ads` over one SMTP session.
+        """
+        self._send(lambda to: [self._get_mail(ad, to) for ad in ads])
+
+    def notify_digest(self, ads):
+        """
+        Sends one mail per recipient that lists all `ads`.
+        """
+        self._send(lambda to: [self._get_digest_mail(ads, to)])
+
+    def _send(self, get_mails):
+        """
+        Sends the mails of `get_mails(to)` to all recipients. If the session
+        breaks, it is re-established once and the mails that were not sent
+        yet are sent over the new one.
+        """
         try:
-            server = smtplib.SMTP(self._host, self._port)
-            try:
-                server.starttls()
-            except smtplib.SMTPException:
-                logging.debug("The SMTP server does not support STARTTLS")
-            if self._auth:
-                server.login(self._user, self._pwd)
-            for to in self._to:
-                msg = self._get_mail(ad, to)
-                logging.debug("Sending mail to {}".format(to))
-                server.sendmail(self._sender, to, msg)
+            mails = deque((to, msg) for to in self._to for msg in get_mails(to))
+            for attempt in range(2):
+                try:
+                    with self._pool.session(self._host, self._port, self._auth, self._user, self._pwd) as server:
+                        while mails:
+                            to, msg = mails[0]
+                            logging.debug("Sending mail to {}".format(to))
+                            server.sendmail(self._sender, to, msg)
+                            mails.popleft()
+                    return
+                except (smtplib.SMTPServerDisconnected, OSError) as error:
+                    if attempt == 1:
+                        raise
+                    logging.info("SMTP session to {} broke, reconnecting: {}".format(self._host, error))
         except smtplib.SMTPHeloError:
             logging.error("Communication with SMTP server {} failed".format(self._host))
         except smtplib.SMTPAuthenticationError as error:
@@ -102,10 +257,63 @@ class EmailNotification(Notification):
             logging.error("Connection to {} was refused!".format(self._host))
         except Exception as error:
             logging.error("Failed to send email notification: {}".format(error.args))
-        finally:
-            try:
-                server.quit()
-            except:pass
 
     def serialize(self):
         return {"type": "email", "to": self._to}
+
+
+class DigestNotification(Notification):
+    """
+    Collects ads and passes them on to `notification` in one digest (see
+    Notification.notify_digest()) once `count` ads are collected or `window`
+    seconds after the first ad of the digest arrived, whichever is first.
+    """
+
+    def __init__(self, notification, window=None, count=None):
+        if window is None and count is None:
+            raise ValueError("A digest needs a window and/or a count")
+        self._notification = notification
+        self._window = window
+        self._count = count
+        self._ads = list()
+        self._timer = None
+        self._lock = Lock()
+
+    @property
+    def notification(self):
+        return self._notification
+
+    def notify(self, ad):
+        self.notify_batch([ad])
+
+    def notify_batch(self, ads):
+        digests = list()
+        with self._lock:
+            for ad in ads:
+                self._ads.append(ad)
+                if self._count is not None and len(self._ads) >= self._count:
+                    digests.append(self._take())
+            if self._ads and self._timer is None and self._window is not None:
+                self._timer = Timer(self._window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        for digest in digests:
+            self._notification.notify_digest(digest)
+
+    def _take(self):
+        ads, self._ads = self._ads, list()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return ads
+
+    def flush(self):
+        with self._lock:
+            ads = self._take()
+        if ads:
+            self._notification.notify_digest(ads)
+
+    def serialize(self):
+        d = self._notification.serialize()
+        d["digest"] = {"window": self._window, "count": self._count}
+        return d
@@ -24,12 +24,158 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import time
+import logging
+from queue import Queue, Full
+from threading import Thread, Lock, current_thread
 from notifications import Notification
 
+
+class NotificationDispatcher(object):
+    """
+    Delivers notifications in the background. Notifications are queued in a
+    bounded queue that is drained by a pool of `workers` threads. When the
+    queue holds `max_queue` notifications further ones are dropped (and
+    counted) instead of blocking the caller. The ads of a dropped
+    notification are already stored, they are never notified. Batches for
+    a notification that is still queued are merged into the queued one
+    (see submit_batch()), so they are not dropped.
+    """
+
+    def __init__(self, workers = 2, max_queue = 1000):
+        self._queue = Queue(max_queue)
+        self._batches = dict()  # deliver -> the ads list of its queued batch
+        self._workers = list()
+        self._target_workers = 0
+        self._lock = Lock()
+        self._delivered = 0
+        self._failed = 0
+        self._dropped = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self.configure(workers, max_queue)
+
+    def configure(self, workers = None, max_queue = None):
+        if max_queue is not None:
+            self._queue.maxsize = max_queue
+        if workers is None:
+            return
+        with self._lock:
+            self._target_workers = max(1, workers)
+            surplus = len(self._workers) - self._target_workers
+            while len(self._workers) < self._target_workers:
+                worker = Thread(target = self._work, name = "NotificationWorker", daemon = True)
+                self._workers.append(worker)
+                worker.start()
+        for _ in range(surplus):
+            self._queue.put(None)   # a surplus worker quits
+
+    def submit(self, deliver, *args, **kwargs):
+        """
+        Queues the call `deliver(*args, **kwargs)`, usually the notify() or
+        notify_batch() method of a notification. Returns `False` if the queue
+        is full and the notification was dropped.
+        """
+        try:
+            self._queue.put_nowait((deliver, args, kwargs, time.monotonic()))
+            return True
+        except Full:
+            with self._lock:
+                self._dropped += 1
+            logging.warning("Notification queue is full. Dropped a notification.")
+            return False
+
+    def submit_batch(self, deliver, ads):
+        """
+        Queues the call `deliver(ads)`, usually the notify_batch() method of
+        a notification. If a batch for `deliver` is still queued, `ads` are
+        added to it instead, even if the queue is full. Returns `False` if
+        the batch was dropped.
+        """
+        with self._lock:
+            batch = self._batches.get(deliver)
+            if batch is not None:
+                batch.extend(ads)
+                return True
+            batch = list(ads)
+            try:
+                self._queue.put_nowait((deliver, (batch,), dict(), time.monotonic()))
+            except Full:
+                self._dropped += 1
+                logging.warning("Notification queue is full. Dropped a notification of {} ads.".format(len(ads)))
+                return False
+            self._batches[deliver] = batch
+            return True
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                with self._lock:
+                    self._workers.remove(current_thread())
+                return
+            deliver, args, kwargs, queued = item
+            with self._lock:
+                if args and self._batches.get(deliver) is args[0]:
+                    del self._batches[deliver]     # later batches queue anew
+            try:
+                deliver(*args, **kwargs)
+                failed = False
+            except Exception:
+                logging.exception("Notification failed")
+                failed = True
+            latency = time.monotonic() - queued
+            with self._lock:
+                if failed:
+                    self._failed += 1
+                else:
+                    self._delivered += 1
+                self._latency_sum += latency
+                self._latency_max = max(self._latency_max, latency)
+
+    @property
+    def stats(self):
+        """
+        Queue depth and delivery statistics. Latencies are measured from
+        queueing to delivery in seconds. `dropped` counts the notifications
+        that were dropped because the queue was full; their ads were stored
+        but never notified.
+        """
+        with self._lock:
+            done = self._delivered + self._failed
+            return dict(queue_depth=self._queue.qsize(), workers=len(self._workers),
+                        delivered=self._delivered, failed=self._failed, dropped=self._dropped,
+                        average_latency=self._latency_sum / done if done else 0.0,
+                        max_latency=self._latency_max)
+
+    def shutdown(self, timeout = 3):
+        """
+        Delivers the queued notifications for up to `timeout` seconds and
+        stops the workers.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            workers = list(self._workers)
+        for _ in workers:
+            try:
+                self._queue.put(None, timeout = max(0, deadline - time.monotonic()))
+            except Full:
+                break
+        for worker in workers:
+            worker.join(timeout = max(0, deadline - time.monotonic()))
+        if any(worker.is_alive() for worker in workers):
+            logging.warning("{} notifications were not delivered before shutdown".format(self._queue.qsize()))
+
+
 class NotificationServer:
     
-    def __init__(self):
+    def __init__(self, dispatcher = None):
+        """
+        Notifications are delivered by `dispatcher` (a shared
+        `NotificationDispatcher`) if given, otherwise right away.
+        """
         self._notifications = list()
+        self._dispatcher = dispatcher
     
     def add_notification(self, notification):
         if not isinstance(notification, Notification):
@@ -43,7 +189,30 @@ class NotificationServer:
 
     def notify_all(self, *args, **kwargs):
         for notification in self._notifications:
-            notification.notify(*args, **kwargs)
+            if self._dispatcher is not None:
+                self._dispatcher.submit(notification.notify, *args, **kwargs)
+            else:
+                notification.notify(*args, **kwargs)
+
+    def notify_batch(self, ads):
+        """
+        Notifies about all `ads` of one poll at once.
+        """
+        for notification in self._notifications:
+            if self._dispatcher is not None:
+                self._dispatcher.submit_batch(notification.notify_batch, ads)
+            else:
+                notification.notify_batch(ads)
+
+    def flush(self):
+        """
+        Delivers what the notifications hold back (e.g. pending digests).
+        """
+        for notification in self._notifications:
+            if self._dispatcher is not None:
+                self._dispatcher.submit(notification.flush)
+            else:
+                notification.flush()
     
     def __getitem__(self, key):
         return self._notifications[key]
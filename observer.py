@@ -24,13 +24,15 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import time
+import asyncio
 import datetime
 import threading
 import logging
 
 from itertools import compress
+from collections import deque
 from connector import Connector, ConnectionError
+from feed import SharedFeed
 
 
 class Observer(threading.Thread):
@@ -38,11 +40,39 @@ class Observer(threading.Thread):
     # observer states
     RUNNING = "RUNNING"
     PAUSED = "PAUSED"
+
+    # adaptive polling: the share of a page that may fill up with new ads
+    # between two polls, and the number of recent ads the rate is based on
+    page_fill = 0.5
+    arrival_window = 100
     
-    def __init__(self, url, profile, store, assessor, notifications, update_interval = 180, name = "Unnamed Observer"):
+    def __init__(self, url, profile, store, assessor, notifications, update_interval = 180, name = "Unnamed Observer",
+                 prefetch = 1, feed = None, min_interval = None, max_interval = None):
+        """
+        Observers that poll the same URL can share a `feed` (see
+        feed.FeedRegistry). Without a feed the observer polls on its own.
+
+        If `min_interval` or `max_interval` is given the observer adapts its
+        interval to the rate at which new ads arrive, so that a poll rarely
+        needs more than one page. The interval stays between the two bounds;
+        a missing bound defaults to `update_interval` (or the other bound if
+        that lies beyond `update_interval`).
+        """
         super(Observer, self).__init__()
         self._interval = update_interval
-        self._connector = Connector(url, profile)
+        self._adaptive = min_interval is not None or max_interval is not None
+        if min_interval is None:
+            min_interval = min(update_interval, max_interval or update_interval)
+        if max_interval is None:
+            max_interval = max(update_interval, min_interval)
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._effective_interval = update_interval
+        self._arrivals = deque(maxlen = self.arrival_window)   # datetimes of recent ads, oldest first
+        if feed is None:
+            feed = SharedFeed(Connector(url, profile, prefetch = prefetch))
+        self._feed = feed
+        self._connector = feed.connector
         self._store = store
         self._assessor = assessor
         self._notifications = notifications
@@ -50,15 +80,28 @@ class Observer(threading.Thread):
         self._quit = False
         self._time_mark = datetime.datetime.now() - datetime.timedelta(days = 1)
         self._state = Observer.RUNNING
+        self._state_listeners = list()
+        self._wakeup = threading.Event()    # set on quit, pause and resume
+        self._async_wakeup = None           # the same for run_async(), with its loop
+        self._process_lock = threading.Lock()  # held while ads are stored and notified
+        self._closed = False
+        self._queue_delay = 0.0             # seconds this observer's polls were queued by the limiter
+        self._last_queue_delay = 0.0
+        self._loop = None
         self.name = name
+        self._feed.subscribe(self)
     
     def serialize(self):
         d = dict()
         d["name"] = self._name
         d["url"] = self._connector.url
         d["interval"] = self._interval
+        d["effective_interval"] = self._effective_interval
+        if self._adaptive:
+            d["min_interval"] = self._min_interval
+            d["max_interval"] = self._max_interval
         d["profile"] = self._connector.profile_name
-        d["store"] = self._store.path is not None
+        d["store"] = self._store.serialize()
 
         if self._assessor is not None:
             d["criteria"] = [criterion.serialize() for criterion in self._assessor.criteria]
@@ -72,7 +115,50 @@ class Observer(threading.Thread):
 
     @state.setter
     def state(self, value):
+        changed = value != self._state
         self._state = value
+        if changed:
+            self._signal()
+        for listener in list(self._state_listeners):
+            listener(self, value)
+
+    def add_state_listener(self, listener):
+        """
+        `listener(observer, state)` is called whenever the state is set.
+        """
+        self._state_listeners.append(listener)
+
+    def remove_state_listener(self, listener):
+        if listener in self._state_listeners:
+            self._state_listeners.remove(listener)
+
+    @property
+    def interval(self):
+        """
+        The current (effective) update interval.
+        """
+        return self._effective_interval
+
+    @property
+    def time_mark(self):
+        return self._time_mark
+
+    @property
+    def stats(self):
+        """
+        Polling statistics. The queue delay covers the polls made by this
+        observer, the parse cache is shared by all observers of the feed.
+        """
+        return dict(queue_delay=dict(last_poll=self._last_queue_delay, total=self._queue_delay),
+                    parse_cache=self._connector.parse_cache_stats)
+
+    def _record_queue_delay(self, delay):
+        self._last_queue_delay = delay
+        self._queue_delay += delay
+
+    @property
+    def assessor(self):
+        return self._assessor
 
     @property
     def notifications(self):
@@ -83,39 +169,116 @@ class Observer(threading.Thread):
         Make the Thread quit
         """
         self._quit = True
+        self._signal()
+        self._feed.unsubscribe(self)
 
-    def _process_ads(self, ads):
-        if len(ads) == 0: return
-        hits = map(self._assessor.check, ads)
-        hit_ads = [ad for ad in compress(ads, hits)]
-        new_ads = self._store.add_ads(hit_ads)
-        for ad in new_ads:
+    def close(self):
+        """
+        Quits and closes the store. Ads that are being processed are stored
+        first, later ones are ignored.
+        """
+        self.quit()
+        with self._process_lock:
+            self._closed = True
+            self._store.close()
+
+    def _signal(self):
+        """
+        Wakes run() or run_async() up.
+        """
+        self._wakeup.set()
+        if self._async_wakeup is not None:
             try:
-                logging.info("Observer '{}' Found Ad: {}".format(self._name, ad["title"]))
-            except KeyError:
-                logging.info("Observer '{}' Found Ad: {}".format(self._name, ad.key))
-            if self._notifications:
-                self._notifications.notify_all(ad)
-        self._time_mark = sorted(ads, key = lambda ad: ad.datetime)[-1].datetime
+                self._loop.call_soon_threadsafe(self._async_wakeup.set)
+            except RuntimeError:
+                pass    # the loop is closed
+
+    def _adapt_interval(self, ads):
+        self._arrivals.extend(sorted(ad.datetime for ad in ads))
+        page_size = self._connector.page_size
+        if not self._arrivals or not page_size:
+            return
+        span = (datetime.datetime.now() - self._arrivals[0]).total_seconds()
+        if span <= 0:
+            return
+        rate = len(self._arrivals) / span   # new ads per second
+        interval = self.page_fill * page_size / rate
+        self._effective_interval = min(max(interval, self._min_interval), self._max_interval)
+        logging.debug("Observer '{}' sees {:.2f} ads per minute and polls every {:.0f}s".format(
+            self._name, rate * 60, self._effective_interval))
+
+    def _process_ads(self, ads, hits = None):
+        """
+        Stores and notifies the ads that match. `hits` are the results of
+        the assessor if they are known already (one boolean per ad).
+        """
+        with self._process_lock:
+            if self._closed:
+                return
+            if self._adaptive:
+                self._adapt_interval(ads)
+            if len(ads) == 0: return
+            if hits is None:
+                hits = self._assessor.check_batch(ads)
+            hit_ads = [ad for ad in compress(ads, hits)]
+            new_ads = self._store.add_ads(hit_ads)
+            for ad in new_ads:
+                try:
+                    logging.info("Observer '{}' Found Ad: {}".format(self._name, ad["title"]))
+                except KeyError:
+                    logging.info("Observer '{}' Found Ad: {}".format(self._name, ad.key))
+            if self._notifications and new_ads:
+                self._notifications.notify_batch(new_ads)
+            self._time_mark = sorted(ads, key = lambda ad: ad.datetime)[-1].datetime
+
+    def poll(self):
+        """
+        Polls for new ads once. Used by run() and by `runtime.SchedulerRuntime`.
+        """
+        logging.info("Observer '{}' polling for new ads since {}".format(self._name, self._time_mark))
+        try:
+            self._feed.poll(self)
+        except ConnectionError as ex:
+            logging.info("Observer '{}' connection failed with message: {}".format(self._name, ex.args[0]))
 
     def run(self):
         self._state = Observer.RUNNING
         while True:
+            self._wakeup.clear()
+            if self._quit:
+                return
+            if self._state == Observer.RUNNING:
+                self.poll()
+                if self._quit:
+                    return   # Quit now if quit() was called while fetching ads
+                self._wakeup.wait(self.interval)    # sleep until the next poll, quit() or pause
+            else:
+                self._wakeup.wait()     # paused until resumed or quit()
+
+    async def run_async(self, executor = None):
+        """
+        The coroutine version of run(), used by `runtime.AsyncioRuntime`.
+        Blocking work (parsing, the store and notifications) is done in
+        `executor`.
+        """
+        self._state = Observer.RUNNING
+        self._loop = asyncio.get_running_loop()
+        self._async_wakeup = asyncio.Event()
+        while True:
+            self._async_wakeup.clear()
+            if self._quit:
+                return
+            timeout = None      # paused until resumed or quit()
             if self._state == Observer.RUNNING:
                 logging.info("Observer '{}' polling for new ads since {}".format(self._name, self._time_mark))
                 try:
-                    ads = self._connector.ads_after(self._time_mark)
-                    if self._quit:
-                        return   # Quit now if quit() was called while fetching ads
-
-                    self._process_ads(ads)
-
+                    await self._feed.poll_async(self, executor)
                 except ConnectionError as ex:
                     logging.info("Observer '{}' connection failed with message: {}".format(self._name, ex.args[0]))
-
-            # going to sleep
-            next_time = datetime.datetime.now() + datetime.timedelta(seconds=self._interval)
-            while datetime.datetime.now() < next_time:
-                time.sleep(1)
                 if self._quit:
-                    return   # Quit now if quit() was called while sleeping
+                    return
+                timeout = self.interval
+            try:
+                await asyncio.wait_for(self._async_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
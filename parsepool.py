@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import logging
+import multiprocessing
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from connector import ConnectionError
+
+
+def _parse(profile, body):
+    """
+    Runs in a worker process. Returns the tag names and a tuple of tag values
+    per ad, which is all that travels back to the server process.
+    """
+    names = tuple(profile.tags)
+    rows = [tuple(tags[name] for name in names) for tags in profile.parse(str(body, profile.encoding))]
+    return names, rows
+
+
+class ParsePool(object):
+    """
+    Parses pages in a pool of worker processes, so parsing is not limited to
+    one CPU core by the GIL. Profiles are sent to the workers by pickling,
+    they must therefore be importable there. Observers, stores and
+    notifications stay in the server process.
+
+    The workers are started by a fork server (or spawned where there is
+    none, e.g. on Windows) rather than forked from the server process,
+    which runs many threads. If a worker dies, the pool is replaced by a
+    new one.
+    """
+
+    def __init__(self, workers = None):
+        self._workers = workers or os.cpu_count() or 1
+        self._lock = Lock()
+        self._executor = self._create_executor()
+
+    def _create_executor(self):
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        return ProcessPoolExecutor(max_workers = self._workers, mp_context = multiprocessing.get_context(method))
+
+    @property
+    def workers(self):
+        return self._workers
+
+    def parse(self, profile, body):
+        """
+        Decodes and parses the raw page `body` with `profile` and returns the
+        list of tag dictionaries. Blocks until a worker is done. Raises
+        `connector.ConnectionError` if the worker died.
+        """
+        executor = self._executor
+        try:
+            names, rows = executor.submit(_parse, profile, body).result()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    logging.warning("A parse worker died. Restarting the parse pool.")
+                    self._executor = self._create_executor()
+                    executor.shutdown(wait = False)
+            raise ConnectionError("A parse worker died while parsing a {} page".format(profile.name))
+        return [dict(zip(names, values)) for values in rows]
+
+    def shutdown(self):
+        self._executor.shutdown(wait = False)
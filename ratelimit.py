@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+from threading import Lock
+
+
+class RateLimiter(object):
+    """
+    A token bucket per host. Each host earns `rate` tokens per second and
+    holds at most `burst` of them; every request takes one. If the bucket is
+    empty the request is not refused but queued: reserve() hands out a token
+    the bucket will only earn in the future and tells the caller how long to
+    wait for it. With `rate` set to `None` requests are never delayed.
+    """
+
+    def __init__(self, rate = None, burst = 1):
+        self._rate = rate
+        self._burst = burst
+        self._buckets = dict()  # host -> [tokens, time of last update]
+        self._lock = Lock()
+
+    def configure(self, rate = None, burst = 1):
+        with self._lock:
+            self._rate = rate
+            self._burst = max(1, burst)
+            self._buckets.clear()
+
+    def _bucket(self, host, now):
+        bucket = self._buckets.setdefault(host, [self._burst, now])
+        bucket[0] = min(self._burst, bucket[0] + (now - bucket[1]) * self._rate)
+        bucket[1] = now
+        return bucket
+
+    def reserve(self, host):
+        """
+        Takes a token for a request to `host` and returns the number of
+        seconds the request has to wait for it.
+        """
+        with self._lock:
+            if not self._rate:
+                return 0.0
+            bucket = self._bucket(host, time.monotonic())
+            bucket[0] -= 1
+            return max(0.0, -bucket[0] / self._rate)
+
+    def acquire(self, host):
+        """
+        Waits until a request to `host` may be sent. Returns the waiting time.
+        """
+        delay = self.reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def penalize(self, host, seconds):
+        """
+        Delays all further requests to `host` by `seconds`, e.g. after the
+        host asked us to back off.
+        """
+        with self._lock:
+            if not self._rate:
+                return
+            bucket = self._bucket(host, time.monotonic())
+            bucket[0] = min(bucket[0], 0) - seconds * self._rate
+
+
+shared_limiter = RateLimiter()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+A runtime decides how observers are executed. The `ThreadRuntime` runs every
+observer in a thread of its own. The `SchedulerRuntime` keeps the due times
+of all observers in one heap and hands due polls to a bounded thread pool.
+The `AsyncioRuntime` runs all observers as coroutines on a single event loop
+and does the blocking work in a small thread pool. With the latter two
+hundreds of observers need only a handful of threads.
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import concurrent.futures
+from threading import Thread, Condition
+from concurrent.futures import ThreadPoolExecutor
+
+import asynchttp
+
+
+class ThreadRuntime(object):
+
+    name = "thread"
+
+    def add(self, observer):
+        observer.start()
+
+    def remove(self, observer):
+        observer.quit()
+
+    def shutdown(self, observers, timeout = 3):
+        """
+        Stops all observers at once and waits up to `timeout` seconds for all
+        of them to finish.
+        """
+        for observer in observers:
+            observer.quit()
+        deadline = time.monotonic() + timeout
+        for observer in observers:
+            observer.join(timeout = max(0, deadline - time.monotonic()))
+            if observer.is_alive():
+                logging.warning("Timeout while waiting for observer '{}' to shut down".format(observer.name))
+            else:
+                logging.info("Observer '{}' successfully shut down".format(observer.name))
+
+
+class SchedulerRuntime(object):
+
+    name = "scheduler"
+
+    def __init__(self, workers = 8):
+        """
+        Up to `workers` observers are polled at the same time.
+        """
+        self._heap = []             # [due time, sequence number, observer or None if cancelled]
+        self._entries = dict()      # observer -> its entry in the heap
+        self._observers = set()
+        self._polling = set()       # observers that are being polled right now
+        self._sequence = itertools.count()
+        self._condition = Condition()
+        self._quit = False
+        self._executor = ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "ObserverWorker")
+        self._dispatcher = Thread(target = self._dispatch, name = "Scheduler", daemon = True)
+        self._dispatcher.start()
+
+    def _schedule(self, observer, due):
+        self._cancel(observer)
+        entry = [due, next(self._sequence), observer]
+        self._entries[observer] = entry
+        heapq.heappush(self._heap, entry)
+        self._condition.notify()
+
+    def _cancel(self, observer):
+        entry = self._entries.pop(observer, None)
+        if entry is not None:
+            entry[2] = None     # dropped when it reaches the top of the heap
+
+    def add(self, observer):
+        observer.add_state_listener(self._state_changed)
+        with self._condition:
+            self._observers.add(observer)
+            if observer.state == observer.RUNNING:
+                self._schedule(observer, time.monotonic())
+
+    def remove(self, observer):
+        observer.remove_state_listener(self._state_changed)
+        observer.quit()
+        with self._condition:
+            self._observers.discard(observer)
+            self._cancel(observer)
+
+    def _state_changed(self, observer, state):
+        with self._condition:
+            if observer not in self._observers or observer in self._polling:
+                return  # rescheduled after the poll
+            if state == observer.RUNNING:
+                if observer not in self._entries:
+                    self._schedule(observer, time.monotonic())
+            else:
+                self._cancel(observer)
+
+    def is_running(self, observer):
+        with self._condition:
+            return observer in self._entries or observer in self._polling
+
+    def __len__(self):
+        return len(self._observers)
+
+    def _dispatch(self):
+        with self._condition:
+            while not self._quit:
+                while self._heap and self._heap[0][2] is None:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                observer = heapq.heappop(self._heap)[2]
+                del self._entries[observer]
+                self._polling.add(observer)
+                self._executor.submit(self._poll, observer)
+
+    def _poll(self, observer):
+        try:
+            if not self._quit:
+                observer.poll()
+        except Exception:
+            logging.exception("Observer '{}' crashed while polling".format(observer.name))
+        finally:
+            with self._condition:
+                self._polling.discard(observer)
+                if observer in self._observers and observer.state == observer.RUNNING and not self._quit:
+                    self._schedule(observer, time.monotonic() + observer.interval)
+                self._condition.notify_all()
+
+    def shutdown(self, observers, timeout = 3):
+        """
+        Stops all observers. Polls in progress are given up to `timeout`
+        seconds to finish.
+        """
+        for observer in observers:
+            observer.quit()
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._quit = True
+            self._heap.clear()
+            self._entries.clear()
+            self._condition.notify_all()
+            while self._polling and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            if self._polling:
+                logging.warning("Timeout while waiting for {} observers to finish polling".format(len(self._polling)))
+            else:
+                logging.info("All observers successfully shut down")
+        self._executor.shutdown(wait = False)
+        self._dispatcher.join(timeout = timeout)
+
+
+class AsyncioRuntime(object):
+
+    name = "asyncio"
+
+    def __init__(self, workers = 4):
+        """
+        `workers` is the number of threads that parse pages, update stores
+        and send notifications.
+        """
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "ObserverWorker")
+        self._loop.set_default_executor(self._executor)    # also used for DNS lookups
+        self._tasks = dict()    # observer -> asyncio.Task
+        self._thread = Thread(target = self._run_loop, name = "AsyncioRuntime", daemon = True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def add(self, observer):
+        asyncio.run_coroutine_threadsafe(self._start(observer), self._loop).result()
+
+    async def _start(self, observer):
+        self._tasks[observer] = self._loop.create_task(self._observe(observer))
+
+    async def _observe(self, observer):
+        try:
+            await observer.run_async(self._executor)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logging.exception("Observer '{}' crashed".format(observer.name))
+        finally:
+            self._tasks.pop(observer, None)
+
+    def remove(self, observer):
+        observer.quit()
+        self._loop.call_soon_threadsafe(self._cancel, observer)
+
+    def _cancel(self, observer):
+        task = self._tasks.get(observer)
+        if task is not None:
+            task.cancel()
+
+    def is_running(self, observer):
+        return observer in self._tasks
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def shutdown(self, observers, timeout = 3):
+        """
+        Stops all observers and the event loop. Waits up to `timeout` seconds
+        for the observers to finish.
+        """
+        for observer in observers:
+            observer.quit()
+        if not self._thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._cancel_all(timeout), self._loop).result(timeout + 1)
+        except concurrent.futures.TimeoutError:
+            logging.warning("Timeout while waiting for the observers to shut down")
+        else:
+            logging.info("All observers successfully shut down")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout = timeout)
+        self._executor.shutdown(wait = False)
+
+    async def _cancel_all(self, timeout):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout = timeout)
+        asynchttp.shared_pool.close()
+
+
+runtimes = {runtime.name: runtime for runtime in (ThreadRuntime, SchedulerRuntime, AsyncioRuntime)}
@@ -29,6 +29,14 @@ from command import CommandError
 from api.webapi import WebApi
 from config import Config
 from threading import Thread
+from feed import FeedRegistry
+from runtime import SchedulerRuntime
+from parsepool import ParsePool
+from notificationserver import NotificationDispatcher
+from notifications import smtp_pool
+import httppool
+import asynchttp
+import ratelimit
 import logging
 import time
 
@@ -37,10 +45,20 @@ class ServerError(Exception):pass
 
 class Server(Thread):
     
-    def __init__(self):
+    def __init__(self, runtime = None, parse_workers = 0):
+        """
+        `runtime` executes the observers (see the runtime module). By default
+        a central scheduler polls the observers when they are due. With
+        `parse_workers` > 0 pages are parsed in that many worker processes.
+        """
         super(Server, self).__init__()
         self._config = self._create_config()
+        self._runtime = runtime or SchedulerRuntime()
+        self._parse_pool = ParsePool(parse_workers) if parse_workers > 0 else None
         self._observers = list()
+        self._feeds = FeedRegistry(parser = self._parse_pool)
+        notifications = self._config.notifications
+        self._dispatcher = NotificationDispatcher(workers=notifications.workers, max_queue=notifications.queue_size)
         self._command_queue = Queue()
         self._quit = False
         self._web_api = None
@@ -61,9 +79,50 @@ class Server(Thread):
             'web': {
                 'host': 'localhost',
                 'port': 8118
+            },
+            'http': {
+                'pool_size': 4,         # idle keep-alive connections per host
+                'idle_timeout': 30.0,   # seconds until an idle connection is dropped
+                'rate': None,           # requests per second and host (None = unlimited)
+                'burst': 1              # requests per host that may be sent at once
+            },
+            'notifications': {
+                'workers': 2,           # threads that deliver notifications
+                'queue_size': 1000      # notifications that may wait for delivery. Further ones are
+                                        # dropped and their ads never notified (see notification_stats)
             }
         }, fixed=True)
 
+    def apply_config(self):
+        """
+        Applies configuration values that take effect immediately. Called
+        after the configuration was changed. Raises `ValueError` without
+        applying anything if one of these values is invalid.
+        """
+        self._check_config()
+        http = self._config.http
+        httppool.shared_pool.configure(max_size=http.pool_size, idle_timeout=http.idle_timeout)
+        asynchttp.shared_pool.configure(max_size=http.pool_size, idle_timeout=http.idle_timeout)
+        ratelimit.shared_limiter.configure(rate=http.rate, burst=http.burst)
+        notifications = self._config.notifications
+        self._dispatcher.configure(workers=notifications.workers, max_queue=notifications.queue_size)
+
+    def _check_config(self):
+        http = self._config.http
+        notifications = self._config.notifications
+        for name, value, types in [("http.pool_size", http.pool_size, (int,)),
+                                   ("http.idle_timeout", http.idle_timeout, (int, float)),
+                                   ("http.rate", http.rate, (int, float, type(None))),
+                                   ("http.burst", http.burst, (int,)),
+                                   ("notifications.workers", notifications.workers, (int,)),
+                                   ("notifications.queue_size", notifications.queue_size, (int,))]:
+            if type(value) not in types or (value is not None and value < 0):
+                raise ValueError("Invalid value for `{}`: {!r}".format(name, value))
+
+    @property
+    def feeds(self):
+        return self._feeds
+
     def add_observer(self, observer):
         if (observer.name in [other.name for other in self._observers]):
             logging.info("Replacing observer '{}' on server".format(observer.name))
@@ -72,13 +131,15 @@ class Server(Thread):
             logging.info("Adding observer '{}' to server".format(observer.name))
             
         self._observers.append(observer)
-        observer.start()
+        self._runtime.add(observer)
     
     def remove_observer(self, name):
         try:
             observer = next(observer for observer in self._observers if observer.name == name)
-            observer.quit()
+            self._runtime.remove(observer)
             self._observers.remove(observer)
+            observer.close()
+            observer.notifications.flush()     # send its pending digests
         except StopIteration:
             raise ServerError("No observer with the name of '{}'".format(name))
 
@@ -165,25 +226,33 @@ class Server(Thread):
         logging.info("Shutting down all services")
         if self._web_api:
             self._web_api.quit()
+        self._runtime.shutdown(self._observers)
+        if self._parse_pool:
+            self._parse_pool.shutdown()
         for observer in self._observers:
-            observer.quit()
+            observer.notifications.flush()     # send pending digests
+            observer.close()
+        self._dispatcher.shutdown()
+        smtp_pool.close()
         if self._web_api:
             self._web_api.join(timeout=3)
             if self._web_api.is_alive():
                 logging.warning("Timeout while waiting for web API to shut down")
             else:
                 logging.info("Web API successfully shut down")
-        for observer in self._observers:
-            observer.join(timeout=3)
-            if observer.is_alive():
-                logging.warning("Timeout while waiting for observer '{}' to shut down".format(observer.name))
-            else:
-                logging.info("Observer '{}' successfully shut down".format(observer.name))
 
     @property
     def config(self):
         return self._config
     
+    @property
+    def dispatcher(self):
+        return self._dispatcher
+
+    @property
+    def runtime(self):
+        return self._runtime
+
     @property
     def command_queue(self):
         return self._command_queue
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import pickle
+import sqlite3
+import datetime
+from threading import RLock
+
+from adstore import AdStore
+
+
+class SqliteAdStore(object):
+    """
+    An ad store with the same interface as `adstore.AdStore` that keeps the ads
+    in an SQLite database instead of memory. Ads are ordered by their datetime
+    tag. All ads of one call to add_ads() or remove_ads() are written in a
+    single transaction. `max_age` and `max_count` work like in AdStore.
+    """
+
+    _chunk_size = 500   # stay well below SQLite's limit of host parameters
+
+    def __init__(self, path = None, max_age = None, max_count = None):
+        self._path = path
+        if max_age is not None and not isinstance(max_age, datetime.timedelta):
+            max_age = datetime.timedelta(seconds = max_age)
+        self._max_age = max_age
+        self._max_count = max_count
+        self._lock = RLock()
+        self._db = None
+        self.load()
+
+    def _setup_schema(self):
+        # Only has an effect on new databases. Lets evictions shrink the file.
+        self._db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS ads ("
+                             "id INTEGER PRIMARY KEY, key NOT NULL, datetime, ad BLOB NOT NULL)")
+            self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS ads_key ON ads (key)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS ads_datetime ON ads (datetime, id)")
+
+    @staticmethod
+    def _sql_value(value):
+        """
+        SQLite has no datetime type. ISO 8601 strings sort in the same order
+        as the datetimes they represent.
+        """
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        return value
+
+    def _existing_keys(self, keys):
+        existing = set()
+        keys = list(keys)
+        for i in range(0, len(keys), self._chunk_size):
+            chunk = keys[i:i + self._chunk_size]
+            query = "SELECT key FROM ads WHERE key IN ({})".format(",".join("?" * len(chunk)))
+            existing.update(row[0] for row in self._db.execute(query, chunk))
+        return existing
+
+    def length(self):
+        return self._length
+
+    def contains(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM ads WHERE key = ?", (self._sql_value(key),)).fetchone()
+            return row is not None
+
+    def get(self, key, default = None):
+        with self._lock:
+            row = self._db.execute("SELECT ad FROM ads WHERE key = ?", (self._sql_value(key),)).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    def save(self):
+        """
+        Every change is committed right away. There is nothing left to save.
+        """
+        return self._path is not None
+
+    def load(self):
+        with self._lock:
+            self.close()
+            self._db = sqlite3.connect(self._path or ":memory:", check_same_thread = False)
+            self._setup_schema()
+            self._length = self._db.execute("SELECT COUNT(*) FROM ads").fetchone()[0]
+            with self._db:
+                self._evict()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def add_ads(self, ads):
+        """
+        'ads' is a list of new ads
+        """
+        with self._lock:
+            with self._db:
+                known_keys = self._existing_keys(self._sql_value(ad.key) for ad in ads)
+                added_ads = []
+                rows = []
+                for ad in ads:
+                    key = self._sql_value(ad.key)
+                    if key not in known_keys:
+                        known_keys.add(key)
+                        added_ads.append(ad)
+                        rows.append((key, self._sql_value(ad.datetime), pickle.dumps(ad)))
+                self._db.executemany("INSERT INTO ads (key, datetime, ad) VALUES (?, ?, ?)", rows)
+                self._length += len(rows)
+                evicted = self._evict()
+            if evicted:
+                # Outside the transaction, but still under the lock that guards the connection
+                self._db.execute("PRAGMA incremental_vacuum").fetchall()
+        return added_ads
+
+    def _evict(self):
+        """
+        Applies the retention policy and returns the number of evicted ads.
+        """
+        evicted = 0
+        if self._max_age is not None:
+            cutoff = self._sql_value(datetime.datetime.now() - self._max_age)
+            evicted += self._db.execute("DELETE FROM ads WHERE datetime < ?", (cutoff,)).rowcount
+        if self._max_count is not None and self._length - evicted > self._max_count:
+            excess = self._length - evicted - self._max_count
+            evicted += self._db.execute("DELETE FROM ads WHERE id IN "
+                                        "(SELECT id FROM ads ORDER BY datetime, id LIMIT ?)", (excess,)).rowcount
+        self._length -= evicted
+        return evicted
+
+    def remove_ads(self, ads):
+        with self._lock, self._db:
+            known_keys = self._existing_keys(self._sql_value(ad.key) for ad in ads)
+            removed_ads = []
+            for ad in ads:
+                key = self._sql_value(ad.key)
+                if key in known_keys:
+                    known_keys.remove(key)
+                    removed_ads.append(ad)
+            self._db.executemany("DELETE FROM ads WHERE key = ?",
+                                 [(self._sql_value(ad.key),) for ad in removed_ads])
+            self._length -= len(removed_ads)
+            return removed_ads
+
+    def ads_between(self, start = None, end = None):
+        """
+        Returns all ads with `start` <= datetime <= `end` ordered by datetime.
+        Either bound can be None.
+        """
+        conditions = ["1"]
+        params = []
+        if start is not None:
+            conditions.append("datetime >= ?")
+            params.append(self._sql_value(start))
+        if end is not None:
+            conditions.append("datetime <= ?")
+            params.append(self._sql_value(end))
+        query = "SELECT ad FROM ads WHERE {} ORDER BY datetime, id".format(" AND ".join(conditions))
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [pickle.loads(row[0]) for row in rows]
+
+    @property
+    def path(self):
+        return self._path
+
+    def serialize(self):
+        """
+        The store options as accepted by the create_observer command.
+        """
+        max_age = self._max_age.total_seconds() if self._max_age is not None else None
+        return {"backend": "sqlite", "max_age": max_age, "max_count": self._max_count}
+
+    def _select(self, offset, limit):
+        with self._lock:
+            rows = self._db.execute("SELECT ad FROM ads ORDER BY datetime, id LIMIT ? OFFSET ?",
+                                    (limit, offset)).fetchall()
+        return [pickle.loads(row[0]) for row in rows]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            indices = range(*key.indices(self._length))
+            if len(indices) == 0:
+                return []
+            first = min(indices[0], indices[-1])
+            ads = self._select(first, abs(indices[-1] - indices[0]) + 1)
+            return [ads[i - first] for i in indices]
+        if key < 0:
+            key += self._length
+        ads = self._select(key, 1) if key >= 0 else []
+        if not ads:
+            raise IndexError("AdStore index out of range")
+        return ads[0]
+
+
+def migrate_pickle_store(pickle_path, store):
+    """
+    Copies all ads from a pickle based `adstore.AdStore` (including its journal)
+    into `store`. Afterwards the old files are renamed with a ".migrated"
+    suffix so the migration only happens once.
+    """
+    old_store = AdStore(pickle_path, autosave = False, journal = True)
+    store.add_ads(old_store[:])
+    journal_path = old_store.journal_path
+    old_store.close()
+    for path in [pickle_path, journal_path, journal_path + ".old"]:
+        if os.path.exists(path):
+            os.replace(path, path + ".migrated")
+    return store
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+Local stand-ins for the websites UpdateJunkie polls and the mail servers it
+sends notifications to. The `FixtureServer` serves pages in the format of
+`FixtureProfile` and counts accepted connections and requests. The
+`FixtureSmtpServer` accepts mail and counts connections and logins.
+`wait_for()` polls a condition in tests of background threads.
+"""
+
+import time
+import gzip
+import hashlib
+import datetime
+import threading
+import urllib.parse
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn, ThreadingTCPServer, StreamRequestHandler
+
+from profiles import base
+
+
+class FixtureProfile(base.ProfileBase):
+    """
+    Every line of a page is one ad: "<id>;<ISO datetime>;<title>;<price>".
+    Pages are selected with the `page` query parameter.
+    """
+
+    name = "Fixture"
+
+    @property
+    def tags(self):
+        return ["id", "datetime", "title", "price"]
+
+    @property
+    def key_tag(self):
+        return "id"
+
+    @property
+    def datetime_tag(self):
+        return "datetime"
+
+    @property
+    def encoding(self):
+        return "utf-8"
+
+    def first_page(self, url):
+        return self._set_page(url, 0)
+
+    def next_page(self, url):
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query))
+        return self._set_page(url, int(query["page"]) + 1)
+
+    def _set_page(self, url, page):
+        parts = list(urllib.parse.urlsplit(url))
+        query = dict(urllib.parse.parse_qsl(parts[3]))
+        query["page"] = page
+        parts[3] = urllib.parse.urlencode(query)
+        return urllib.parse.urlunsplit(parts)
+
+    def parse(self, html):
+        ads = []
+        for line in html.splitlines():
+            if line:
+                (id, dtime, title, price) = line.split(";")
+                ads.append({"id": int(id), "datetime": datetime.datetime.strptime(dtime, "%Y-%m-%dT%H:%M:%S"),
+                            "title": title, "price": float(price)})
+        return ads
+
+
+class FixtureServer(ThreadingMixIn, HTTPServer):
+    """
+    Serves `pages` (a list of lists of tag dictionaries) with keep-alive
+    HTTP/1.1 connections on a free local port. Responses are gzipped if the
+    client accepts it and carry an ETag for conditional requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.delay = 0      # seconds to wait before each response
+        self.throttle = 0   # number of requests to answer with 429 (too many requests)
+        self.truncate = 0   # number of responses to cut off before the body
+        self.connections = 0
+        self.requests = []
+        self._counter_lock = threading.Lock()
+        super(FixtureServer, self).__init__(("localhost", 0), FixtureRequestHandler)
+        self._thread = threading.Thread(target = self.serve_forever, kwargs = dict(poll_interval = 0.05),
+                                        daemon = True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        return "http://localhost:{}/ads".format(self.server_address[1])
+
+    def get_request(self):
+        request = super(FixtureServer, self).get_request()
+        with self._counter_lock:
+            self.connections += 1
+        return request
+
+    def render(self, page):
+        if page >= len(self.pages):
+            return b""
+        lines = ["{id};{datetime:%Y-%m-%dT%H:%M:%S};{title};{price}".format(**tags) for tags in self.pages[page]]
+        return "\n".join(lines).encode("utf-8")
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        with self.server._counter_lock:
+            self.server.requests.append((self.path, dict(self.headers)))
+            throttle = self.server.throttle > 0
+            if throttle:
+                self.server.throttle -= 1
+            truncate = not throttle and self.server.truncate > 0
+            if truncate:
+                self.server.truncate -= 1
+        time.sleep(self.server.delay)
+        if throttle:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if truncate:
+            self.send_response(200)
+            self.send_header("Content-Length", "100")
+            self.end_headers()
+            self.close_connection = True
+            return
+        body = self.server.render(int(query.get("page", 0)))
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("ETag", etag)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureSmtpServer(ThreadingTCPServer):
+    """
+    Speaks just enough SMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT, DATA,
+    NOOP, RSET and QUIT. STARTTLS is not offered. Received messages are
+    collected in `messages` as (sender, recipients, data) tuples. Once
+    `drop_after` messages were received, the next connection that sends a
+    message is dropped.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        self.connections = 0
+        self.logins = 0
+        self.messages = []
+        self.drop_after = None  # drop the connection once this many messages were received
+        self._counter_lock = threading.Lock()
+        super(FixtureSmtpServer, self).__init__(("localhost", 0), FixtureSmtpHandler)
+        self._thread = threading.Thread(target = self.serve_forever, kwargs = dict(poll_interval = 0.05),
+                                        daemon = True)
+        self._thread.start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def get_request(self):
+        request = super(FixtureSmtpServer, self).get_request()
+        with self._counter_lock:
+            self.connections += 1
+        return request
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FixtureSmtpHandler(StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        self.reply("220 localhost fixture SMTP")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii").strip()
+            verb = command.split(" ")[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN")
+            elif verb == "AUTH":
+                with self.server._counter_lock:
+                    self.server.logins += 1
+                self.reply("235 Authentication successful")
+            elif verb == "MAIL":
+                with self.server._counter_lock:
+                    drop = self.server.drop_after is not None and len(self.server.messages) >= self.server.drop_after
+                    if drop:
+                        self.server.drop_after = None
+                if drop:
+                    return
+                sender, recipients = command[10:].strip("<>"), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command[8:].strip("<>"))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in self.rfile:
+                    if data_line.rstrip(b"\r\n") == b".":
+                        break
+                    data.append(data_line)
+                with self.server._counter_lock:
+                    self.server.messages.append((sender, recipients, b"".join(data)))
+                self.reply("250 OK")
+            elif verb in ("NOOP", "RSET"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+def make_pages(count, per_page = 10, newest = None):
+    """
+    Creates `count` pages of ads, newest first, one minute apart.
+    """
+    newest = newest or datetime.datetime.now().replace(microsecond = 0)
+    return [[{"id": page * per_page + nr,
+              "datetime": newest - datetime.timedelta(minutes = page * per_page + nr),
+              "title": "Ad {}".format(page * per_page + nr),
+              "price": float(page * per_page + nr)}
+             for nr in range(per_page)]
+            for page in range(count)]
+
+
+def wait_for(condition, timeout = 5):
+    """
+    Waits up to `timeout` seconds for `condition()` to become true and
+    returns its last result.
+    """
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
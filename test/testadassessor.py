@@ -26,7 +26,7 @@ SOFTWARE.
 
 import unittest
 from adassessor import *
-from connector import *
+from adstore import Ad
 
 
 class TestAdAssessor(unittest.TestCase):
@@ -86,6 +86,36 @@ class TestAdAssessor(unittest.TestCase):
         self._base_ad["title"] = "Das ist ein schneller Wagen"
         self.assertTrue(self._assessor.check(self._base_ad))
 
+    def test_criterion_from_json(self):
+        for data in [{"tag": "price", "type": "less_than", "limit": 5},
+                     {"tag": "title", "type": "keywords_all", "keywords": ["a"]},
+                     {"tag": "title", "type": "keywords_not", "keywords": ["b", "c"]}]:
+            self.assertDictEqual(data, AdCriterion.from_json(data).serialize())
+
+    def test_compiled_check_short_circuits(self):
+        self._assessor.add_criteria(AdCriterionKeywordsAny({"tag": "title", "keywords": ["Tag"]}),
+                                    AdCriterionLessThan({"tag": "price", "limit": 50}))
+        self._base_ad["price"] = 70     # no title tag, but the price check runs first and fails
+        self.assertFalse(self._assessor.check(self._base_ad))
+        self._base_ad["price"] = 30
+        self._base_ad["title"] = "Ein schöner TAG"
+        self.assertTrue(self._assessor.check(self._base_ad))
+        self._assessor.add_criterion(AdCriterionKeywordsNot({"tag": "title", "keywords": ["schön"]}))
+        self.assertFalse(self._assessor.check(self._base_ad))
+
+    def test_check_batch(self):
+        self._assessor.add_criteria(AdCriterionGreaterThan({"tag": "price", "limit": 20}),
+                                    AdCriterionLessThan({"tag": "price", "limit": 80}),
+                                    AdCriterionKeywordsAny({"tag": "title", "keywords": ["Rot", "blau"]}),
+                                    AdCriterionKeywordsNot({"tag": "title", "keywords": ["defekt"]}))
+        titles = ["Rotes Rad", "Blaues Rad defekt", "Grünes Rad", "BLAU"]
+        ads = [Ad({"id": nr, "dt": nr, "price": nr % 100, "title": titles[nr % 4]}, "id", "dt")
+               for nr in range(200)]
+        mask = self._assessor.check_batch(ads)
+        self.assertListEqual([self._assessor.check(ad) for ad in ads], mask)
+        self.assertEqual(62, sum(mask))
+        self.assertListEqual([], self._assessor.check_batch([]))
+
     def test_adassessor_returns_true_if_empty(self):
         self._base_ad["title"] = "Expensive Blablabla"
         self.assertTrue (self._assessor.check(self._base_ad))
\ No newline at end of file
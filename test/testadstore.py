@@ -41,6 +41,9 @@ class TestAdStore(unittest.TestCase):
 
     def tearDown(self):
         os.remove(self.path)
+
+    def reopen_store(self):
+        return AdStore(self.path)
         
     def test_add_and_remove_ads(self):
         added_ads = self.store.add_ads(self.some_ads)
@@ -67,3 +70,118 @@ class TestAdStore(unittest.TestCase):
         self.store.add_ads(self.some_ads)
         for i in range(1,self.store.length()):
             self.assertGreaterEqual(self.store[i].datetime, self.store[i-1].datetime)
+
+    def test_out_of_order_insertion(self):
+        self.store.add_ads(self.some_ads[5:])
+        self.store.add_ads([self.some_ads[i] for i in [3, 0, 4]])
+        self.store.add_ads([self.some_ads[2], self.some_ads[1]])
+        self.assertListEqual(list(range(10)), [ad.key for ad in self.store])
+        self.store.remove_ads([self.some_ads[0], self.some_ads[9], self.some_ads[4]])
+        self.assertListEqual([1,2,3,5,6,7,8], [ad.key for ad in self.store])
+
+    def test_ads_between(self):
+        self.store.add_ads(list(reversed(self.some_ads)))
+        self.assertListEqual([3,4,5], [ad.key for ad in self.store.ads_between(3, 5)])
+        self.assertListEqual([0,1], [ad.key for ad in self.store.ads_between(end = 1)])
+        self.assertListEqual([8,9], [ad.key for ad in self.store.ads_between(8)])
+        self.assertListEqual([], self.store.ads_between(20, 30))
+
+    def test_retention(self):
+        now = datetime.datetime.now()
+        for ad in self.some_ads:
+            ad.datetime = now - datetime.timedelta(hours = 10 - ad.key)
+        self.store.close()
+        self.store = AdStore(self.path, journal = self.store.journal_path is not None,
+                             max_age = datetime.timedelta(hours = 5, minutes = 30), max_count = 4)
+        self.store.add_ads(self.some_ads[:3])
+        self.assertEqual(0, self.store.length())
+        self.store.add_ads(self.some_ads[3:])
+        self.assertListEqual([6,7,8,9], [ad.key for ad in self.store])
+        self.assertFalse(self.store.contains(5))
+        another_store = self.reopen_store()
+        self.assertListEqual([6,7,8,9], [ad.key for ad in another_store])
+        backend = "journal" if self.store.journal_path is not None else "pickle"
+        self.assertDictEqual({"backend": backend, "max_age": 19800.0, "max_count": 4}, self.store.serialize())
+
+    def test_contains_and_get(self):
+        self.store.add_ads(self.some_ads)
+        self.assertTrue(self.store.contains(3))
+        self.assertIs(self.store.get(3), self.some_ads[3])
+        self.store.remove_ads([self.some_ads[3]])
+        self.assertFalse(self.store.contains(3))
+        self.assertIsNone(self.store.get(3))
+
+    def test_duplicates_are_not_added(self):
+        self.store.add_ads(self.some_ads[:5])
+        added_ads = self.store.add_ads(self.some_ads + self.some_ads)
+        self.assertListEqual(self.some_ads[5:], added_ads)
+        self.assertEqual(len(self.some_ads), self.store.length())
+        another_store = self.reopen_store()
+        self.assertTrue(all(another_store.contains(ad.key) for ad in self.some_ads))
+
+
+class TestJournalAdStore(TestAdStore):
+
+    path = "./testJournalStore.save"
+
+    def setUp(self):
+        self.store = AdStore(self.path, journal = True, compact_every = 3)
+        self.some_ads = [Ad({"id":nr, "dt": nr, "title":"Ad number {}".format(nr)}, "id", "dt")
+                         for nr in range(10)]
+
+    def tearDown(self):
+        self.store.close()
+        for path in [self.path, self.path + ".journal", self.path + ".journal.old"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def reopen_store(self):
+        self.store.close()
+        return AdStore(self.path, journal = True)
+
+    def test_journal_replay(self):
+        for ad in self.some_ads:
+            self.store.add_ads([ad])
+        self.store.remove_ads(self.some_ads[2:4])
+        self.store.close()
+        another_store = AdStore(self.path, journal = True)
+        expected_ids = [ad.key for ad in self.some_ads if ad.key not in (2, 3)]
+        self.assertListEqual(expected_ids, [ad.key for ad in another_store])
+        another_store.close()
+
+    def test_torn_journal_record(self):
+        self.store.add_ads(self.some_ads[:2])
+        self.store.close()
+        with open(self.store.journal_path, "ab") as f:
+            f.write(b"\x80\x04\x95garbage")
+        another_store = AdStore(self.path, journal = True)
+        self.assertEqual(2, another_store.length())
+        another_store.add_ads(self.some_ads[2:4])
+        another_store.close()
+        another_store = AdStore(self.path, journal = True)
+        self.assertEqual(4, another_store.length())
+        another_store.close()
+
+
+class TestCompactAd(unittest.TestCase):
+
+    def setUp(self):
+        self.tags = {"id": 1, "dt": datetime.datetime.now(), "title": "Compact", "price": 5.0}
+        self.ad = CompactAd(self.tags, "id", "dt")
+
+    def test_mapping_interface(self):
+        self.assertEqual(self.tags, dict(self.ad))
+        self.assertEqual("Compact for 5.0", "{title} for {price}".format(**self.ad))
+        self.assertEqual(1, self.ad.key)
+        self.ad.datetime = 42
+        self.assertEqual(42, self.ad["dt"])
+        self.assertRaises(KeyError, self.ad.__getitem__, "description")
+        self.assertFalse(hasattr(self.ad, "__dict__"))
+
+    def test_shared_schema(self):
+        other = CompactAd(dict(self.tags, id = 2), "id", "dt")
+        self.assertIs(self.ad.schema, other.schema)
+        restored = pickle.loads(pickle.dumps(other))
+        self.assertIs(self.ad.schema, restored.schema)
+        self.assertEqual(other, restored)
+        self.assertRaises(AttributeError, CompactAd, self.tags, "id", "datetime")
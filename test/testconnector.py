@@ -25,7 +25,10 @@ SOFTWARE.
 """
 
 import unittest
+import time
+import asyncio
 from connector import *
+from fixtures import FixtureServer, FixtureProfile, make_pages
 
 
 class TestConnector(unittest.TestCase):
@@ -47,4 +50,87 @@ class TestConnector(unittest.TestCase):
         timedelta = datetime.timedelta(hours = 1)
         ads = self.connector.ads_in(timedelta)
         for ad in ads:
-            self.assertTrue(ad.datetime > datetime.datetime.now()-timedelta)
\ No newline at end of file
+            self.assertTrue(ad.datetime > datetime.datetime.now()-timedelta)
+
+
+class CountingFixtureProfile(FixtureProfile):
+
+    def __init__(self):
+        self.next_page_calls = 0
+
+    def next_page(self, url):
+        self.next_page_calls += 1
+        return super(CountingFixtureProfile, self).next_page(url)
+
+
+class TestConnectorFixture(unittest.TestCase):
+
+    def setUp(self):
+        self._server = FixtureServer(make_pages(10))
+        self._profile = CountingFixtureProfile()
+        self.connector = Connector(self._server.url, self._profile)
+
+    def tearDown(self):
+        self._server.stop()
+
+    def test_ads_after_stops_at_timelimit(self):
+        timelimit = self._server.pages[4][5]["datetime"]
+        ads = self.connector.ads_after(timelimit)
+        self.assertListEqual(list(range(45)), [ad.key for ad in ads])
+        self.assertEqual(6, len(self._server.requests))     # page 5 has no new ads
+
+    def test_pages_are_walked_linearly(self):
+        ads = self.connector.ads_after(datetime.datetime(1970, 1, 1), maxpages = 8)
+        self.assertEqual(80, len(ads))
+        self.assertEqual(7, self._profile.next_page_calls)
+        self.assertEqual(10, len(self.connector.frontpage_ads()))
+
+    def test_prefetch(self):
+        self._server.delay = 0.1
+        connector = Connector(self._server.url, self._profile, prefetch = 4)
+        timelimit = self._server.pages[5][5]["datetime"]
+        start = time.time()
+        ads = connector.ads_after(timelimit)
+        duration = time.time() - start
+        self.assertListEqual(list(range(55)), [ad.key for ad in ads])
+        self.assertLess(duration, 0.5)      # 7 pages are needed, sequentially that takes 0.7s
+        self.assertLessEqual(len(self._server.requests), 10)
+
+    def test_conditional_get(self):
+        timelimit = self._server.pages[1][5]["datetime"]
+        self.assertEqual(15, len(self.connector.ads_after(timelimit, conditional = True)))
+        self.assertEqual("gzip, deflate", self._server.requests[0][1]["Accept-Encoding"])
+        del self._server.requests[:]
+        self.assertListEqual([], self.connector.ads_after(timelimit, conditional = True))
+        self.assertEqual(1, len(self._server.requests))
+        self.assertIn("If-None-Match", self._server.requests[0][1])
+        self.assertEqual(15, len(self.connector.ads_after(timelimit)))    # other callers get all ads
+        self.assertEqual(25, len(self.connector.ads_in(datetime.datetime.now() - self._server.pages[2][5]["datetime"])))
+        self._server.pages.insert(0, make_pages(1, newest = datetime.datetime.now() + datetime.timedelta(hours = 1))[0])
+        self.assertEqual(10, len(self.connector.ads_after(self._server.pages[1][0]["datetime"], conditional = True)))
+
+    def test_parse_cache(self):
+        connector = Connector(self._server.url, self._profile, parse_cache_size = 2)
+        timelimit = self._server.pages[0][5]["datetime"]
+        connector.ads_after(timelimit)
+        connector.ads_after(timelimit)
+        self.assertDictEqual({"hits": 2, "misses": 2}, connector.parse_cache_stats)
+        self._server.pages[0][0]["title"] = "Changed"
+        self.assertEqual("Changed", connector.ads_after(timelimit)[0]["title"])
+        self.assertDictEqual({"hits": 3, "misses": 3}, connector.parse_cache_stats)
+
+    def test_ads_after_async(self):
+        timelimit = self._server.pages[4][5]["datetime"]
+        ads = asyncio.run(self.connector.ads_after_async(timelimit, conditional = True))
+        self.assertListEqual(list(range(45)), [ad.key for ad in ads])
+        self.assertEqual(6, len(self._server.requests))
+        self.assertListEqual([], asyncio.run(self.connector.ads_after_async(timelimit, conditional = True)))
+        self.assertIn("If-None-Match", self._server.requests[-1][1])
+
+    def test_truncated_response(self):
+        timelimit = self._server.pages[4][5]["datetime"]
+        self._server.truncate = 1
+        self.assertRaises(ConnectionError, self.connector.ads_after, timelimit)
+        self._server.truncate = 1
+        self.assertRaises(ConnectionError, asyncio.run, self.connector.ads_after_async(timelimit))
+        self.assertEqual(45, len(asyncio.run(self.connector.ads_after_async(timelimit))))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import random
+from adstore import Ad
+from adassessor import *
+from criteriaindex import *
+
+
+class TestCriteriaIndex(unittest.TestCase):
+
+    words = ["rot", "blau", "grün", "rad", "auto", "buch", "neu", "alt"]
+
+    def setUp(self):
+        random.seed(7)
+        self._index = CriteriaIndex()
+        self._assessors = dict()
+        for nr in range(40):
+            assessor = AdAssessor()
+            for _ in range(random.randint(0, 3)):
+                assessor.add_criterion(self._random_criterion())
+            self._assessors[nr] = assessor
+            self._index.add(nr, assessor)
+        self._ads = [Ad({"id": nr, "dt": nr, "price": random.randint(0, 100),
+                         "title": " ".join(random.sample(self.words, 3)).title()}, "id", "dt")
+                     for nr in range(100)]
+
+    def _random_criterion(self):
+        criterion_type = random.choice(["less_than", "greater_than", "keywords_all",
+                                        "keywords_any", "keywords_not"])
+        if criterion_type in ("less_than", "greater_than"):
+            return AdCriterion.from_json({"tag": "price", "type": criterion_type, "limit": random.randint(0, 100)})
+        keywords = random.sample(self.words, random.randint(1, 3))
+        return AdCriterion.from_json({"tag": "title", "type": criterion_type, "keywords": keywords})
+
+    def test_match_equals_assessors(self):
+        for ad in self._ads:
+            expected = sorted(key for key, assessor in self._assessors.items() if assessor.check(ad))
+            self.assertListEqual(expected, sorted(self._index.match(ad)))
+
+    def test_match_batch_and_remove(self):
+        self._index.remove(3)
+        masks = self._index.match_batch(self._ads)
+        self.assertNotIn(3, masks)
+        for key, mask in masks.items():
+            self.assertListEqual(self._assessors[key].check_batch(self._ads), mask)
+        self.assertListEqual([1, 2], sorted(self._index.match_batch(self._ads, [1, 2, 3])))
@@ -25,8 +25,13 @@ SOFTWARE.
 """
 
 import unittest
+import time
+import socket
+import email
+from email.header import decode_header, make_header
 from datetime import datetime
 from notifications import *
+from fixtures import FixtureSmtpServer
 
 
 class TestEmailNotification(unittest.TestCase):
@@ -48,4 +53,105 @@ class TestEmailNotification(unittest.TestCase):
                           pwd = None, sender = sender, to = to,
                           mimetype = mimetype, subject = subject, body = body)
         for ad in self._ads:
-            notification._get_mail(ad, to)
\ No newline at end of file
+            notification._get_mail(ad, to)
+
+
+class TestSmtpSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        self._server = FixtureSmtpServer()
+        self._pool = SmtpSessionPool()
+        self._ads = [dict(title="Ad {}".format(nr), price=float(nr)) for nr in range(30)]
+
+    def tearDown(self):
+        self._pool.close()
+        self._server.stop()
+
+    def _notification(self, to=("a@example.com",), user="me"):
+        return EmailNotification(host="localhost", port=self._server.port, sender="junkie@example.com",
+                                 to=list(to), subject="{title}", body="{title} for {price}", auth=True,
+                                 user=user, pwd="secret", pool=self._pool)
+
+    def test_batch_uses_one_session(self):
+        self._notification(to=("a@example.com", "b@example.com")).notify_batch(self._ads)
+        self.assertEqual(60, len(self._server.messages))
+        self.assertEqual(1, self._server.connections)
+        self.assertEqual(1, self._server.logins)
+
+    def test_sessions_are_reused(self):
+        notification = self._notification()
+        for ad in self._ads[:3]:
+            notification.notify(ad)
+        self._notification().notify(self._ads[3])
+        self._notification(user="you").notify(self._ads[4])
+        self.assertEqual(5, len(self._server.messages))
+        self.assertEqual(2, self._server.connections)    # one session per user
+
+    def test_reconnect_during_batch(self):
+        self._server.drop_after = 5
+        self._notification().notify_batch(self._ads)
+        self.assertEqual(30, len(self._server.messages))
+        self.assertEqual(2, self._server.connections)
+
+    def test_reconnect(self):
+        notification = self._notification()
+        notification.notify(self._ads[0])
+        self._pool._sessions[("localhost", self._server.port, "me")][1].sock.shutdown(socket.SHUT_RDWR)   # the connection broke
+        notification.notify(self._ads[1])
+        self.assertEqual(2, len(self._server.messages))
+        self.assertEqual(2, self._server.connections)
+        self._pool._idle_timeout = 0
+        time.sleep(0.01)
+        notification.notify(self._ads[2])
+        self.assertEqual(3, self._server.connections)
+
+
+class TestDigestNotification(unittest.TestCase):
+
+    def setUp(self):
+        self._server = FixtureSmtpServer()
+        self._pool = SmtpSessionPool()
+        self._email = EmailNotification(host="localhost", port=self._server.port, sender="junkie@example.com",
+                                        to=["a@example.com"], subject="{title}", body="{title} for {price}",
+                                        pool=self._pool, digest_subject="{count} new ads",
+                                        digest_body="New ads:\n{ads}", digest_item="* {title}\n")
+        self._ads = [dict(title="Ad {}".format(nr), price=float(nr)) for nr in range(30)]
+
+    def tearDown(self):
+        self._pool.close()
+        self._server.stop()
+
+    def _mail(self, nr):
+        """
+        Subject and body of the `nr`th received mail.
+        """
+        message = email.message_from_bytes(self._server.messages[nr][2])
+        subject = str(make_header(decode_header(message["Subject"])))
+        return subject, message.get_payload(decode=True).decode("utf-8")
+
+    def test_count(self):
+        digest = DigestNotification(self._email, count=10)
+        digest.notify_batch(self._ads[:25])
+        self.assertEqual(2, len(self._server.messages))
+        self.assertEqual("10 new ads", self._mail(0)[0])
+        self.assertIn("* Ad 19\n", self._mail(1)[1])
+        digest.flush()
+        self.assertEqual(3, len(self._server.messages))
+        self.assertEqual("5 new ads", self._mail(2)[0])
+
+    def test_window(self):
+        digest = DigestNotification(self._email, window=0.1)
+        for ad in self._ads[:5]:
+            digest.notify(ad)
+        self.assertEqual(0, len(self._server.messages))
+        deadline = time.time() + 5
+        while not self._server.messages and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(1, len(self._server.messages))
+        self.assertEqual(("5 new ads", "New ads:\n* Ad 0\n* Ad 1\n* Ad 2\n* Ad 3\n* Ad 4\n"), self._mail(0))
+
+    def test_per_ad_mails_unchanged(self):
+        self._email.notify_batch(self._ads[:2])
+        self.assertEqual(2, len(self._server.messages))
+        self.assertEqual(("Ad 1", "Ad 1 for 1.0"), self._mail(1))
+        self.assertRaises(ValueError, DigestNotification, self._email)
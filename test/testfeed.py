@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import datetime
+from feed import FeedRegistry
+from observer import Observer
+from adstore import AdStore
+from adassessor import AdAssessor, AdCriterionLessThan
+from fixtures import FixtureServer, FixtureProfile, make_pages
+
+
+class TestSharedFeed(unittest.TestCase):
+
+    def setUp(self):
+        self._server = FixtureServer(make_pages(3))
+        self._registry = FeedRegistry()
+
+    def tearDown(self):
+        self._server.stop()
+
+    def _observer(self, name, limit, interval = 180):
+        assessor = AdAssessor()
+        assessor.add_criterion(AdCriterionLessThan({"tag": "price", "limit": limit}))
+        feed = self._registry.feed(self._server.url, FixtureProfile())
+        return Observer(self._server.url, FixtureProfile(), AdStore(), assessor, None,
+                        update_interval = interval, name = name, feed = feed)
+
+    def test_observers_share_one_poll(self):
+        cheap = self._observer("cheap", 5)
+        all = self._observer("all", 100)
+        self.assertEqual(1, len(self._registry))
+        self.assertTrue(all._feed.poll(all))
+        self.assertEqual(4, len(self._server.requests))     # pages 0 to 2 and an empty page
+        self.assertEqual(6, cheap._store.length())
+        self.assertEqual(30, all._store.length())
+        self.assertFalse(cheap._feed.poll(cheap))
+        self.assertEqual(4, len(self._server.requests))
+
+    def test_paused_and_removed_subscribers(self):
+        cheap = self._observer("cheap", 5)
+        all = self._observer("all", 100, interval = 0)
+        cheap.state = Observer.PAUSED
+        all._feed.poll(all)
+        self.assertEqual(0, cheap._store.length())
+        cheap.state = Observer.RUNNING
+        all.quit()
+        self.assertListEqual([cheap], cheap._feed.subscribers)
+        self.assertTrue(cheap._feed.poll(cheap))
+        self.assertEqual(6, cheap._store.length())
+
+    def test_ads_are_matched_by_the_index(self):
+        cheap = self._observer("cheap", 5)
+        all = self._observer("all", 100)
+        checked = dict()    # observer name -> number of ads per check_batch() call
+
+        def counting(name, check_batch):
+            def check(ads):
+                checked.setdefault(name, []).append(len(ads))
+                return check_batch(ads)
+            return check
+
+        for observer in [cheap, all]:
+            observer.assessor.check_batch = counting(observer.name, observer.assessor.check_batch)
+        all._feed.poll(all)
+        self.assertEqual(6, cheap._store.length())
+        self.assertEqual(30, all._store.length())
+        self.assertDictEqual({"cheap": [6], "all": [30]}, checked)   # only the ads routed to each assessor
+        cheap.quit()
+        self.assertNotIn(cheap, all._feed._index)
+        self.assertEqual(1, len(all._feed._index))
+
+    def test_late_join(self):
+        all = self._observer("all", 100)
+        all._feed.poll(all)
+        self.assertEqual(30, all._store.length())
+        late = self._observer("late", 100)
+        self.assertTrue(late._feed.poll(late))
+        self.assertEqual(30, late._store.length())
+        self.assertNotIn("If-None-Match", self._server.requests[-1][1])
+
+    def test_resume_after_missed_polls(self):
+        cheap = self._observer("cheap", 5, interval = 0)
+        all = self._observer("all", 100, interval = 0)
+        cheap._feed.poll(cheap)
+        self.assertEqual(6, cheap._store.length())
+        cheap.state = Observer.PAUSED
+        newest = self._server.pages[0][0]
+        self._server.pages[0].insert(0, dict(newest, id = 100, title = "Ad 100",
+                                             datetime = newest["datetime"] + datetime.timedelta(minutes = 1)))
+        all._feed.poll(all)
+        self.assertEqual(31, all._store.length())
+        cheap.state = Observer.RUNNING
+        self.assertTrue(cheap._feed.poll(cheap))
+        self.assertEqual(7, cheap._store.length())
+
+    def test_feeds_per_url(self):
+        feed = self._registry.feed(self._server.url, FixtureProfile())
+        self.assertIs(feed, self._registry.feed(self._server.url, FixtureProfile()))
+        self.assertIsNot(feed, self._registry.feed(self._server.url + "?other", FixtureProfile()))
+
+    def test_prefetch_is_the_maximum(self):
+        feed = self._registry.feed(self._server.url, FixtureProfile(), prefetch = 2)
+        self._registry.feed(self._server.url, FixtureProfile(), prefetch = 4)
+        self.assertEqual(4, feed.connector.prefetch)
+        self._registry.feed(self._server.url, FixtureProfile())
+        self.assertEqual(4, feed.connector.prefetch)
+
+
+if __name__ == "__main__":
+    unittest.main()
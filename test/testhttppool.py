@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import time
+import datetime
+from httppool import *
+from connector import Connector
+from fixtures import FixtureServer, FixtureProfile, make_pages
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self._server = FixtureServer(make_pages(3))
+        self._pool = ConnectionPool(max_size = 2, idle_timeout = 30)
+
+    def tearDown(self):
+        self._pool.close()
+        self._server.stop()
+
+    def test_connections_are_reused(self):
+        for page in range(3):
+            response = self._pool.request("{}?page={}".format(self._server.url, page))
+            self.assertEqual(200, response.status)
+            self.assertTrue(response.body.startswith("{}".format(page * 10).encode("utf-8")))
+        self.assertEqual(3, len(self._server.requests))
+        self.assertEqual(1, self._server.connections)
+
+    def test_idle_timeout(self):
+        self._pool.configure(idle_timeout = 0.05)
+        self._pool.request(self._server.url)
+        time.sleep(0.1)
+        self._pool.request(self._server.url)
+        self.assertEqual(2, self._server.connections)
+
+    def test_connectors_share_the_pool(self):
+        timelimit = datetime.datetime.now() - datetime.timedelta(days = 1)
+        connectors = [Connector(self._server.url, FixtureProfile(), pool = self._pool) for _ in range(3)]
+        for connector in connectors:
+            self.assertEqual(30, len(connector.ads_after(timelimit)))
+        self.assertEqual(12, len(self._server.requests))    # 3 pages and one empty page each
+        self.assertEqual(1, self._server.connections)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import random
+from keywordmatcher import *
+
+
+class TestKeywordMatcher(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(42)
+        self._texts = ["".join(random.choice("abcab ") for _ in range(random.randint(0, 40)))
+                       for _ in range(200)]
+        self._keyword_sets = [["".join(random.choice("abc") for _ in range(random.randint(1, 5)))
+                               for _ in range(random.randint(1, 80))]
+                              for _ in range(30)]
+        self._keyword_sets.extend([[], [""], ["a", ""], ["ab", "ab", "b"]])
+
+    def _assert_substring_semantics(self, matcher, keywords):
+        for text in self._texts:
+            expected = [keyword in text for keyword in keywords]
+            mask = matcher.find(text)
+            self.assertListEqual(expected, [bool(mask & (1 << i)) for i in range(len(keywords))])
+            self.assertEqual(any(expected), matcher.contains_any(text))
+            self.assertEqual(all(expected), matcher.contains_all(text))
+
+    def test_automaton(self):
+        for keywords in self._keyword_sets:
+            matcher = KeywordMatcher(keywords)
+            matcher._build_automaton()
+            self._assert_substring_semantics(matcher, keywords)
+
+    def test_short_keyword_lists(self):
+        for keywords in self._keyword_sets:
+            matcher = KeywordMatcher(keywords)
+            matcher._transitions = None
+            self._assert_substring_semantics(matcher, keywords)
+
+    def test_overlapping_keywords(self):
+        keywords = ["he", "she", "his", "hers"]
+        matcher = KeywordMatcher(keywords)
+        matcher._build_automaton()
+        self.assertEqual(0b1011, matcher.find("ushers"))
+        self.assertTrue(matcher.contains_any("ahishe"))
+        self.assertFalse(matcher.contains_any("hxs"))
@@ -25,8 +25,11 @@ SOFTWARE.
 """
 
 import unittest
+import time
+import threading
 from notificationserver import *
 from notifications import *
+from fixtures import wait_for
 
 
 class TestNotificationServer(unittest.TestCase):
@@ -50,4 +53,75 @@ class TestNotificationServer(unittest.TestCase):
         self.assertRaises(IndexError, self.notificationServer.__getitem__, 2)
         del self.notificationServer[0]
         self.assertIs(self.notificationServer[0], b)        
-        self.assertRaises(IndexError, self.notificationServer.__getitem__, 1)
\ No newline at end of file
+        self.assertRaises(IndexError, self.notificationServer.__getitem__, 1)
+
+
+class SlowNotification(Notification):
+
+    def __init__(self, delay = 0.0):
+        self.delay = delay
+        self.ads = []
+        self.release = threading.Event()
+
+    def notify(self, ad):
+        if self.delay:
+            self.release.wait(self.delay)
+        self.ads.append(ad)
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = NotificationDispatcher(workers = 2, max_queue = 2)
+        self.notificationServer = NotificationServer(self.dispatcher)
+
+    def tearDown(self):
+        self.dispatcher.shutdown(timeout = 1)
+
+    def test_notify_all_does_not_block(self):
+        slow = SlowNotification(delay = 5)
+        self.notificationServer.add_notification(slow)
+        start = time.time()
+        self.notificationServer.notify_all(0)
+        self.notificationServer.notify_all(1)
+        self.assertTrue(wait_for(lambda: self.dispatcher.stats["queue_depth"] == 0))
+        self.notificationServer.notify_all(2)
+        self.notificationServer.notify_all(3)
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(2, self.dispatcher.stats["queue_depth"])
+        self.assertEqual(0, self.dispatcher.stats["dropped"])
+        self.notificationServer.notify_all(4)   # two are being delivered, two are queued
+        self.assertEqual(1, self.dispatcher.stats["dropped"])
+        slow.release.set()
+        self.assertTrue(wait_for(lambda: self.dispatcher.stats["delivered"] == 4))
+        self.assertListEqual([0, 1, 2, 3], sorted(slow.ads))
+        self.assertGreater(self.dispatcher.stats["max_latency"], 0)
+
+    def test_queued_batches_are_merged(self):
+        slow = SlowNotification(delay = 5)
+        other = SlowNotification()
+        self.notificationServer.add_notification(slow)
+        self.notificationServer.notify_all(0)
+        self.notificationServer.notify_all(1)
+        self.assertTrue(wait_for(lambda: self.dispatcher.stats["queue_depth"] == 0))   # both workers are busy
+        self.notificationServer.add_notification(other)
+        for poll in range(5):
+            self.notificationServer.notify_batch([10 + poll])
+        self.assertEqual(2, self.dispatcher.stats["queue_depth"])   # one batch per notification
+        self.assertEqual(0, self.dispatcher.stats["dropped"])
+        slow.release.set()
+        self.assertTrue(wait_for(lambda: self.dispatcher.stats["delivered"] == 4))
+        self.assertListEqual([0, 1, 10, 11, 12, 13, 14], sorted(slow.ads))
+        self.assertListEqual([10, 11, 12, 13, 14], other.ads)
+        self.notificationServer.notify_batch([20])
+        self.assertTrue(wait_for(lambda: other.ads[-1:] == [20]))
+
+    def test_configure_workers(self):
+        self.dispatcher.configure(workers = 4)
+        self.assertEqual(4, self.dispatcher.stats["workers"])
+        self.dispatcher.configure(workers = 1)
+        self.assertTrue(wait_for(lambda: self.dispatcher.stats["workers"] == 1))
+        notification = SlowNotification()
+        self.notificationServer.add_notification(notification)
+        self.notificationServer.notify_all("ad")
+        self.assertTrue(wait_for(lambda: notification.ads == ["ad"]))
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import time
+import datetime
+import threading
+from observer import Observer
+from runtime import ThreadRuntime, AsyncioRuntime
+from adstore import Ad, AdStore
+from adassessor import AdAssessor
+from fixtures import FixtureServer, FixtureProfile, make_pages, wait_for
+
+
+class TestAdaptiveInterval(unittest.TestCase):
+
+    def setUp(self):
+        self._server = FixtureServer(make_pages(3))    # one ad per minute, ten per page
+
+    def tearDown(self):
+        self._server.stop()
+
+    def _observer(self, **kwargs):
+        return Observer(self._server.url, FixtureProfile(), AdStore(), AdAssessor(), None, update_interval = 180,
+                        **kwargs)
+
+    def test_fixed_interval(self):
+        observer = self._observer()
+        observer.poll()
+        self.assertEqual(180, observer.interval)
+        self.assertEqual(180, observer.serialize()["effective_interval"])
+        self.assertNotIn("min_interval", observer.serialize())
+
+    def test_interval_follows_arrival_rate(self):
+        observer = self._observer(min_interval = 60, max_interval = 900)
+        observer.poll()
+        self.assertAlmostEqual(300, observer.interval, delta = 15)     # half a page fills up in 5 minutes
+        self.assertEqual(observer.interval, observer.serialize()["effective_interval"])
+        self.assertEqual(60, observer.serialize()["min_interval"])
+
+    def test_interval_bounds(self):
+        busy = self._observer(min_interval = 200)
+        busy.poll()
+        self.assertEqual(200, busy.interval)
+        self._server.pages = make_pages(1, newest = datetime.datetime.now() - datetime.timedelta(hours = 10))
+        quiet = self._observer(max_interval = 900)
+        quiet.poll()
+        self.assertEqual(900, quiet.interval)
+
+
+class FakeFeed(object):
+    """
+    Stands in for a `feed.SharedFeed` and counts the polls.
+    """
+
+    class FakeConnector(object):
+        url = "http://localhost/"
+        profile_name = "Fixture"
+        page_size = 10
+
+    def __init__(self):
+        self.connector = FakeFeed.FakeConnector()
+        self.polls = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, observer): pass
+
+    def unsubscribe(self, observer): pass
+
+    def poll(self, observer):
+        with self._lock:
+            self.polls += 1
+
+    async def poll_async(self, observer, executor = None):
+        self.poll(observer)
+
+
+class ClosingAdStore(AdStore):
+
+    closed = 0
+
+    def close(self):
+        self.closed += 1
+        super(ClosingAdStore, self).close()
+
+
+class TestObserverThread(unittest.TestCase):
+
+    def setUp(self):
+        self._feed = FakeFeed()
+        self._runtime = ThreadRuntime()
+
+    def _observer(self, name = "Observer", interval = 180):
+        return Observer(None, None, AdStore(), AdAssessor(), None, update_interval = interval, name = name,
+                        feed = self._feed)
+
+    def test_pause_and_resume(self):
+        observer = self._observer()
+        self._runtime.add(observer)
+        self.assertTrue(wait_for(lambda: self._feed.polls == 1))
+        observer.state = Observer.PAUSED
+        observer.state = Observer.RUNNING      # resuming polls right away
+        self.assertTrue(wait_for(lambda: self._feed.polls == 2, timeout = 1))
+        self._runtime.shutdown([observer])
+        self.assertFalse(observer.is_alive())
+
+    def test_close(self):
+        store = ClosingAdStore()
+        observer = Observer(None, None, store, AdAssessor(), None, feed = self._feed)
+        self._runtime.add(observer)
+        self.assertTrue(wait_for(lambda: self._feed.polls == 1))
+        observer.close()
+        self.assertEqual(1, store.closed)
+        ads = [Ad({"id": 1, "datetime": datetime.datetime.now()}, "id", "datetime")]
+        observer._process_ads(ads)      # a poll that was still running
+        self.assertEqual(0, store.length())
+        observer.join(1)
+        self.assertFalse(observer.is_alive())
+
+    def test_shutdown_time_is_bounded(self):
+        durations = []
+        for count in (10, 200):
+            observers = [self._observer("Observer {}".format(nr)) for nr in range(count)]
+            for observer in observers:
+                self._runtime.add(observer)
+            observers[0].state = Observer.PAUSED
+            self.assertTrue(wait_for(lambda: self._feed.polls >= count))
+            start = time.time()
+            self._runtime.shutdown(observers)
+            durations.append(time.time() - start)
+            self.assertFalse(any(observer.is_alive() for observer in observers))
+            self._feed.polls = 0
+        self.assertLess(max(durations), 0.5)    # quitting used to take up to a second per observer
+
+
+class TestObserverCoroutine(unittest.TestCase):
+
+    def setUp(self):
+        self._feed = FakeFeed()
+        self._runtime = AsyncioRuntime(workers = 1)
+
+    def tearDown(self):
+        self._runtime.shutdown([])
+
+    def _observer(self, name = "Observer", interval = 180):
+        return Observer(None, None, AdStore(), AdAssessor(), None, update_interval = interval, name = name,
+                        feed = self._feed)
+
+    def test_pause_and_resume(self):
+        observer = self._observer()
+        self._runtime.add(observer)
+        self.assertTrue(wait_for(lambda: self._feed.polls == 1))
+        observer.state = Observer.PAUSED
+        time.sleep(0.05)
+        observer.state = Observer.RUNNING      # resuming polls right away
+        self.assertTrue(wait_for(lambda: self._feed.polls == 2, timeout = 1))
+        observer.state = Observer.PAUSED
+        start = time.time()
+        self._runtime.shutdown([observer])
+        self.assertLess(time.time() - start, 0.5)
+        self.assertFalse(self._runtime.is_running(observer))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import datetime
+import os
+import multiprocessing
+from parsepool import ParsePool
+from connector import Connector, ConnectionError
+from fixtures import FixtureServer, FixtureProfile, make_pages
+
+
+class CrashingFixtureProfile(FixtureProfile):
+
+    def parse(self, text):
+        os._exit(1)
+
+
+class TestParsePool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._pool = ParsePool(workers = 2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._pool.shutdown()
+
+    def setUp(self):
+        self._server = FixtureServer(make_pages(3))
+        self._profile = FixtureProfile()
+
+    def tearDown(self):
+        self._server.stop()
+
+    def test_parse(self):
+        body = self._server.render(0)
+        self.assertListEqual(self._profile.parse(str(body, "utf-8")), self._pool.parse(self._profile, body))
+        self.assertListEqual([], self._pool.parse(self._profile, b""))
+
+    def test_connector(self):
+        timelimit = datetime.datetime(1970, 1, 1)
+        connector = Connector(self._server.url, self._profile, parser = self._pool)
+        ads = connector.ads_after(timelimit)
+        expected = Connector(self._server.url, self._profile).ads_after(timelimit)
+        self.assertListEqual([dict(ad) for ad in expected], [dict(ad) for ad in ads])
+        self.assertEqual(30, len(ads))
+
+    def test_without_forkserver(self):
+        get_all_start_methods = multiprocessing.get_all_start_methods
+        multiprocessing.get_all_start_methods = lambda: ["spawn"]     # like on Windows
+        try:
+            pool = ParsePool(workers = 1)
+        finally:
+            multiprocessing.get_all_start_methods = get_all_start_methods
+        try:
+            self.assertEqual(10, len(pool.parse(self._profile, self._server.render(0))))
+        finally:
+            pool.shutdown()
+
+    def test_dead_worker(self):
+        body = self._server.render(0)
+        self.assertRaises(ConnectionError, self._pool.parse, CrashingFixtureProfile(), body)
+        self.assertEqual(10, len(self._pool.parse(self._profile, body)))
+
+
+if __name__ == "__main__":
+    unittest.main()
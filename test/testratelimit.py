@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import time
+import datetime
+from ratelimit import RateLimiter
+from connector import Connector
+from feed import SharedFeed
+from observer import Observer
+from adstore import AdStore
+from adassessor import AdAssessor
+from fixtures import FixtureServer, FixtureProfile, make_pages
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_unlimited(self):
+        limiter = RateLimiter()
+        self.assertListEqual([0.0] * 5, [limiter.reserve("host") for _ in range(5)])
+
+    def test_token_bucket(self):
+        limiter = RateLimiter(rate = 10, burst = 2)
+        delays = [limiter.reserve("host") for _ in range(4)]
+        self.assertListEqual([0.0, 0.0], delays[:2])
+        self.assertAlmostEqual(0.1, delays[2], places = 2)
+        self.assertAlmostEqual(0.2, delays[3], places = 2)
+        self.assertEqual(0.0, limiter.reserve("other host"))
+
+    def test_penalize(self):
+        limiter = RateLimiter(rate = 10, burst = 2)
+        limiter.penalize("host", 1.0)
+        self.assertAlmostEqual(1.1, limiter.reserve("host"), places = 2)
+
+    def test_configure(self):
+        limiter = RateLimiter(rate = 10)
+        limiter.reserve("host")
+        limiter.configure(rate = None)
+        self.assertEqual(0.0, limiter.reserve("host"))
+
+
+class TestRateLimitedConnector(unittest.TestCase):
+
+    def setUp(self):
+        self._server = FixtureServer(make_pages(3))
+        self._profile = FixtureProfile()
+
+    def tearDown(self):
+        self._server.stop()
+
+    def test_requests_are_queued(self):
+        connector = Connector(self._server.url, self._profile, limiter = RateLimiter(rate = 20, burst = 1))
+        start = time.time()
+        self.assertEqual(30, len(connector.ads_after(datetime.datetime(1970, 1, 1))))
+        self.assertGreaterEqual(time.time() - start, 0.14)  # 4 requests, 3 of them wait 50ms
+        self.assertAlmostEqual(0.15, connector.queue_delay["last_poll"], places = 1)
+        connector.ads_after(datetime.datetime(1970, 1, 1))
+        self.assertGreater(connector.queue_delay["total"], connector.queue_delay["last_poll"])
+
+    def test_queue_delay_per_observer(self):
+        feed = SharedFeed(Connector(self._server.url, self._profile, limiter = RateLimiter(rate = 20, burst = 1)))
+        polling, served = [Observer(self._server.url, self._profile, AdStore(), AdAssessor(), None,
+                                    name = name, feed = feed) for name in ("polling", "served")]
+        feed.poll(polling)
+        self.assertAlmostEqual(0.15, polling.stats["queue_delay"]["last_poll"], places = 1)
+        self.assertDictEqual({"last_poll": 0.0, "total": 0.0}, served.stats["queue_delay"])
+        self.assertEqual(30, served._store.length())
+
+    def test_throttled_request_is_retried(self):
+        self._server.throttle = 1
+        connector = Connector(self._server.url, self._profile, limiter = RateLimiter(rate = 100))
+        self.assertEqual(30, len(connector.ads_after(datetime.datetime(1970, 1, 1))))
+        self.assertEqual(5, len(self._server.requests))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import time
+import threading
+from runtime import AsyncioRuntime, SchedulerRuntime
+from observer import Observer
+from adstore import AdStore
+from adassessor import AdAssessor
+from fixtures import FixtureServer, FixtureProfile, make_pages, wait_for
+
+
+class TestAsyncioRuntime(unittest.TestCase):
+
+    def setUp(self):
+        self._server = FixtureServer(make_pages(3))
+        self._runtime = AsyncioRuntime(workers = 2)
+
+    def tearDown(self):
+        self._runtime.shutdown([])
+        self._server.stop()
+
+    def _observer(self, name):
+        return Observer(self._server.url, FixtureProfile(), AdStore(), AdAssessor(), None, name = name)
+
+    def _threads(self):
+        return [thread for thread in threading.enumerate() if "process_request" not in thread.name]
+
+    def test_observers_run_as_coroutines(self):
+        threads = len(self._threads())
+        observers = [self._observer("Observer {}".format(nr)) for nr in range(50)]
+        for observer in observers:
+            self._runtime.add(observer)
+        self.assertTrue(wait_for(lambda: all(observer._store.length() == 30 for observer in observers)))
+        self.assertLessEqual(len(self._threads()), threads + 2)     # the worker threads
+        self.assertEqual(50, len(self._runtime))
+
+    def test_remove_and_shutdown(self):
+        observers = [self._observer("Observer {}".format(nr)) for nr in range(3)]
+        for observer in observers:
+            self._runtime.add(observer)
+        self._runtime.remove(observers[0])
+        self.assertTrue(wait_for(lambda: not self._runtime.is_running(observers[0])))
+        start = time.time()
+        self._runtime.shutdown(observers)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(0, len(self._runtime))
+
+
+class TestSchedulerRuntime(unittest.TestCase):
+
+    def setUp(self):
+        self._server = FixtureServer(make_pages(1))
+        self._runtime = SchedulerRuntime(workers = 2)
+
+    def tearDown(self):
+        self._runtime.shutdown([])
+        self._server.stop()
+
+    def _observer(self, name, interval = 0.1):
+        return Observer(self._server.url, FixtureProfile(), AdStore(), AdAssessor(), None,
+                        update_interval = interval, name = name)
+
+    def test_polls_when_due(self):
+        observers = [self._observer("Observer {}".format(nr), interval = 60) for nr in range(20)]
+        for observer in observers:
+            self._runtime.add(observer)
+        self.assertTrue(wait_for(lambda: all(observer._store.length() == 10 for observer in observers)))
+        time.sleep(0.2)
+        self.assertEqual(40, len(self._server.requests))    # one poll each, the second page is empty
+        self.assertEqual(20, len(self._runtime))
+
+    def test_pause_resume_remove(self):
+        observer = self._observer("Observer")
+        self._runtime.add(observer)
+        self.assertTrue(wait_for(lambda: len(self._server.requests) >= 4))
+        observer.state = Observer.PAUSED
+        self.assertTrue(wait_for(lambda: not self._runtime.is_running(observer)))
+        requests = len(self._server.requests)
+        time.sleep(0.3)
+        self.assertEqual(requests, len(self._server.requests))
+        observer.state = Observer.RUNNING
+        self.assertTrue(wait_for(lambda: len(self._server.requests) > requests))
+        self._runtime.remove(observer)
+        self.assertTrue(wait_for(lambda: not self._runtime.is_running(observer)))
+        requests = len(self._server.requests)
+        time.sleep(0.3)
+        self.assertEqual(requests, len(self._server.requests))
+
+    def test_immediate_shutdown(self):
+        observers = [self._observer("Observer {}".format(nr), interval = 180) for nr in range(5)]
+        for observer in observers:
+            self._runtime.add(observer)
+        self.assertTrue(wait_for(lambda: all(observer._store.length() == 10 for observer in observers)))
+        start = time.time()
+        self._runtime.shutdown(observers)
+        self.assertLess(time.time() - start, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
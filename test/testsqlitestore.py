@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright (c) 2012 Martin Hammerschmied
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import os
+import datetime
+from adstore import Ad, AdStore
+from sqlitestore import *
+
+
+class TestSqliteAdStore(unittest.TestCase):
+
+    path = "testStore.sqlite"
+    pickle_path = "testStore.save"
+
+    def setUp(self):
+        self.store = SqliteAdStore(self.path)
+        now = datetime.datetime.now()
+        self.some_ads = [Ad({"id":nr, "dt": now + datetime.timedelta(minutes = nr), "title":"Ad number {}".format(nr)},
+                            "id", "dt")
+                         for nr in range(10)]
+
+    def tearDown(self):
+        self.store.close()
+        for path in os.listdir("."):
+            if path.startswith(self.path) or path.startswith(self.pickle_path):
+                os.remove(path)
+
+    def test_add_and_remove_ads(self):
+        added_ads = self.store.add_ads(self.some_ads + self.some_ads[:3])
+        self.assertListEqual(self.some_ads, added_ads)
+        ads_to_remove = [self.some_ads[i] for i in [2,3,5,6,8]]
+        removed = self.store.remove_ads(ads_to_remove)
+        self.assertListEqual(ads_to_remove, removed)
+        self.assertEqual(5, self.store.length())
+        self.assertListEqual([0,1,4,7,9], [ad.key for ad in self.store[:]])
+        self.assertEqual(9, self.store[-1].key)
+        self.assertListEqual([9,4,0], [ad.key for ad in self.store[::-2]])
+        self.assertRaises(IndexError, self.store.__getitem__, 5)
+
+    def test_ordered_by_datetime(self):
+        self.store.add_ads(list(reversed(self.some_ads)))
+        self.store.close()
+        another_store = SqliteAdStore(self.path)
+        self.assertListEqual([ad.key for ad in self.some_ads], [ad.key for ad in another_store])
+        self.assertEqual(self.some_ads[4], another_store.get(4))
+        self.assertTrue(another_store.contains(4))
+        self.assertFalse(another_store.contains(42))
+        another_store.close()
+
+    def test_ads_between(self):
+        self.store.add_ads(self.some_ads)
+        start = self.some_ads[3].datetime
+        end = self.some_ads[5].datetime
+        self.assertListEqual([3,4,5], [ad.key for ad in self.store.ads_between(start, end)])
+        self.assertListEqual([8,9], [ad.key for ad in self.store.ads_between(self.some_ads[8].datetime)])
+        self.assertListEqual([0], [ad.key for ad in self.store.ads_between(end = self.some_ads[0].datetime)])
+
+    def test_retention(self):
+        self.store.close()
+        self.store = SqliteAdStore(self.path, max_age = 3600, max_count = 3)
+        for ad in self.some_ads:
+            ad.datetime -= datetime.timedelta(hours = 1, minutes = 5)
+        self.store.add_ads(self.some_ads)
+        self.assertListEqual([7,8,9], [ad.key for ad in self.store])
+        self.assertEqual(3, self.store.length())
+        self.assertDictEqual({"backend": "sqlite", "max_age": 3600.0, "max_count": 3}, self.store.serialize())
+
+    def test_migrate_pickle_store(self):
+        old_store = AdStore(self.pickle_path, journal = True)
+        old_store.add_ads(self.some_ads[:6])
+        old_store.close()
+        migrate_pickle_store(self.pickle_path, self.store)
+        self.assertEqual(6, self.store.length())
+        self.assertFalse(os.path.exists(old_store.journal_path))
+        self.assertTrue(os.path.exists(old_store.journal_path + ".migrated"))
@@ -34,6 +34,7 @@ from api.webapi import WebApi
 from server import Server
 from observer import Observer
 from notificationserver import NotificationServer
+from notifications import Notification, DigestNotification
 
 class TestWebApi(unittest.TestCase):
 
@@ -100,6 +101,15 @@ class TestWebApi(unittest.TestCase):
         self._api_call("/api/config/smtp/port", "PUT", self._encode_object(8123))
         self.assertEqual(self._server.config.smtp.port, 8123)
 
+    def test_command_set_invalid_config(self):
+        for path, value in [("http/burst", None), ("notifications/workers", "2")]:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self._api_call("/api/config/{}".format(path), "PUT", self._encode_object(value))
+            self.assertEqual(400, context.exception.code)
+        self.assertEqual(1, self._server.config.http.burst)
+        self.assertEqual(2, self._server.config.notifications.workers)
+        self.assertTrue(self._server.is_alive())
+
     def test_command_get_config(self):
         smtp_settings = {"host": "smtp.myhost.com", "port": 587, "auth": True,
                          "user": "Moatl", "pwd": "geheim123"}
@@ -128,6 +138,8 @@ class TestWebApi(unittest.TestCase):
         self.assertTrue("MyObserver" in self._server.observers())   # Check if the observer is there
         observer_serialized = self._server["MyObserver"].serialize()    # Check if the server has all the correct properties
         observer_data["name"] = observer_serialized["name"]     # not in the original data
+        observer_data["effective_interval"] = observer_data["interval"]
+        observer_data["store"] = dict(backend=None, max_age=None, max_count=None)
         self.assertDictEqual(observer_data, observer_serialized)
 
     def test_command_add_notification(self):
@@ -174,8 +186,12 @@ class TestWebApi(unittest.TestCase):
         observer = MockObserver("MyObserver")
         self._server.add_observer(observer)
         self.assertIsInstance(self._server["MyObserver"], MockObserver)
+        digest = DigestNotification(DigestRecorder(), count=10)
+        observer.notifications.add_notification(digest)
+        digest.notify({"title": "pending"})
         self._api_call("/api/observer/MyObserver", "DELETE")
         self.assertRaises(KeyError, lambda: self._server["MyObserver"])
+        self.assertListEqual([[{"title": "pending"}]], digest.notification.digests)
 
     def test_command_list_commands(self):
         data = self._api_call("/api/list/commands", "GET")
@@ -201,8 +217,20 @@ class TestWebApi(unittest.TestCase):
         self.assertEqual(content, content_get)
 
 
+class DigestRecorder(Notification):
+
+    def __init__(self):
+        self.digests = []
+
+    def notify_digest(self, ads):
+        self.digests.append(ads)
+
+
 class MockObserver(object):
 
+    RUNNING = Observer.RUNNING
+    interval = 180
+
     def __init__(self, name):
         self._name = name
         self._state = Observer.RUNNING
@@ -223,8 +251,16 @@ class MockObserver(object):
 
     def start(self): pass
 
+    def poll(self): pass
+
+    def add_state_listener(self, listener): pass
+
+    def remove_state_listener(self, listener): pass
+
     def quit(self): self._is_alive = False
 
+    def close(self): self.quit()
+
     def join(self, timeout): pass
 
     def is_alive(self): return self._is_alive